@@ -1,9 +1,10 @@
+import functools
+
 import dash
 import dash_bootstrap_components as dbc
 
-from modules.data_load import load_data
-from modules.data_clean import clean
-from modules.kpi_calculations import calculate_kpis
+from modules import config
+from modules.dataset import PARTITION_COLUMNS, open_dataset
 from modules.charts import (
     total_sales_chart,
     avg_order_chart,
@@ -11,82 +12,216 @@ from modules.charts import (
     category_performance_chart,
     category_sales_per_month_chart,
     rating_pie_chart,
-    category_sales_pie_chart
+    category_sales_pie_chart,
+    sales_growth_chart,
+    top_products_chart,
+    cohort_retention_chart,
+    rfm_segments_chart,
+)
+from modules.anomalies import AnomalyDetector
+from modules.customers import CustomerAnalytics
+from modules.layout import (
+    LazyPages,
+    create_layout,
+    create_home_content,
+    create_filters_content,
+    create_customers_content,
 )
-from modules.layout import create_layout
 from modules.callbacks import register_callbacks
+from modules.background import create_background_manager
+from modules.layout_cache import install_layout_cache, memoized_layout
+from modules.metrics import CACHE_REQUESTS, install_metrics
+from modules.profiling import install_profiling
+from modules.compression import (
+    clear_static_cache,
+    install_compression,
+    static_cache_bytes,
+)
+from modules.memory import MemoryAccount, deep_bytes, install_memory
+from modules.snapshot import save_snapshot_in_background, warm_start
 
 # ======================================================
-# ---------------- Initialize App ---------------------
+# ---------------- Application Factory ----------------
 # ======================================================
-app = dash.Dash(
-    __name__,
-    external_stylesheets=[dbc.themes.BOOTSTRAP],
-    suppress_callback_exceptions=True,
-)
+def create_app(preload=False):
+    """
+    Build the Dash app: load the dataset, set up pages, caches and callbacks.
 
+    With preload=True the app shell and every page are serialized now instead
+    of on first request (see wsgi.py: workers forked afterwards share them).
+    """
+    # ======================================================
+    # ---------------- Initialize App ---------------------
+    # ======================================================
+    app = dash.Dash(
+        __name__,
+        external_stylesheets=[dbc.themes.BOOTSTRAP],
+        suppress_callback_exceptions=True,
+        background_callback_manager=create_background_manager(),
+    )
 
-# ======================================================
-# --------------- Load and Clean Data -----------------
-# ======================================================
-df = load_data()
-df = clean(df)  # Clean the data using modules/data_clean.py
+    # ======================================================
+    # ------------- Load Data and Calculate KPIs ----------
+    # ======================================================
+    # Loads and cleans the orders of every store (modules/data_load.py,
+    # modules/data_clean.py), partitioned per store and year, and derives the
+    # KPI tables; a store is reloaded when its CSV changes on disk.
+    dataset = open_dataset()
 
-# ======================================================
-# ---------------- Calculate KPIs ---------------------
-# ======================================================
-kpis = calculate_kpis(df)
+    # --- Changed CSVs are reloaded by a background thread of each worker,
+    # started on the worker's first request (threads don't survive a fork) ---
+    @app.server.before_request
+    def watch_sources():
+        dataset.refresh_every(config.KPI_REFRESH_SECONDS)
 
-# --- Compute daily average order for chart ---
-avg_order_daily = df.groupby("order_date", as_index=False)["total_amount"].mean()
+    # --- Anomalies in daily sales / orders, fed only the new days on reload ---
+    detector = AnomalyDetector()
+    detector.update(dataset.kpis)
+    dataset.on_change(lambda _dataset: detector.update(dataset.kpis))
 
-# ======================================================
-# ---------------- Create Charts ----------------------
-# ======================================================
-fig_total_sales = total_sales_chart(kpis["sales_over_time"])
-fig_avg_order = avg_order_chart(
-    avg_order_daily
-)  # Fix KeyError by using avg_order_daily
-fig_rating_dist = rating_distribution_chart(df)
-fig_category_pie = category_performance_chart(kpis["sales_by_category"])
-fig_category_sales_per_month = category_sales_per_month_chart(
-    kpis["sales_by_category_quarter"]
-)
-fig_rating_pie = rating_pie_chart(df)
-fig_category_sales_pie = category_sales_pie_chart(df)
-# ======================================================
-# ----------------- Columns to Show -------------------
-# ======================================================
-columns_to_show = [
-    col for col in df.columns if col not in ["year", "month", "month_name", "period"]
-]
+    # ======================================================
+    # ------------- Pages (built on first request) --------
+    # ======================================================
+    # Figures and page contents are only created when a route is first
+    # requested, then memoized by LazyPages, so workers boot without them.
+    def build_home_page():
+        kpis = dataset.kpis
+        return create_home_content(
+            kpis,
+            total_sales_chart(kpis["sales_over_time"], detector.anomalies),
+            avg_order_chart(kpis["avg_order_daily"]),
+            rating_distribution_chart(kpis["rating_counts"]),
+            category_performance_chart(kpis["sales_by_category"]),
+            category_sales_per_month_chart(kpis["sales_by_category_quarter"]),
+            rating_pie_chart(kpis["rating_counts"]),
+            category_sales_pie_chart(kpis["sales_by_category"]),
+        )
+
+    def build_filters_page():
+        # Figure skeletons; the data is patched in by the filter callbacks
+        return create_filters_content(
+            dataset, sales_growth_chart(), top_products_chart()
+        )
+
+    # Cohort retention and RFM segments, computed once per dataset version
+    customer_analytics = CustomerAnalytics(dataset)
+    CACHE_REQUESTS.watch("customers", customer_analytics)
+
+    def build_customers_page():
+        analytics = customer_analytics.get()
+        return create_customers_content(
+            analytics["segments"],
+            cohort_retention_chart(analytics["retention"]),
+            rfm_segments_chart(analytics["segments"]),
+        )
+
+    # ======================================================
+    # ----------------- Columns to Show -------------------
+    # ======================================================
+    columns_to_show = [
+        col for col in dataset.columns if col not in PARTITION_COLUMNS
+    ]
+
+    # ======================================================
+    # ------------------- App Layout ----------------------
+    # ======================================================
+    pages = LazyPages(
+        {
+            "/": build_home_page,
+            "/filters": build_filters_page,
+            "/customers": build_customers_page,
+        }
+    )
+    app.layout = memoized_layout(functools.partial(create_layout, pages))
+
+    # --- Layout and pages are serialized once and served with an ETag ---
+    layout_cache, page_caches = install_layout_cache(app, pages)
+
+    # --- Warm start: restore the serialized pages of the snapshot ---
+    warm_start(dataset, page_caches)
+
+    # --- Rebuild pages lazily from the new data after a dataset reload; the
+    # new data is snapshotted by a background thread ---
+    def reset_pages(_dataset):
+        pages.clear()
+        for page_cache in page_caches.values():
+            page_cache.invalidate()
+        save_snapshot_in_background(dataset, page_caches)
+
+    dataset.on_change(reset_pages)
+
+    # ======================================================
+    # ---------------- Memory Accounting ------------------
+    # ======================================================
+    # Report on config.MEMORY_PATH; with SWIFTSHOP_MEMORY_BUDGET_MB the orders
+    # are shrunk and caches evicted after every load until they fit.
+    memory = MemoryAccount(dataset)
+    memory.watch(
+        "selections",
+        lambda: deep_bytes(dataset.selections.frames()),
+        dataset.selections.clear,
+    )
+    memory.watch(
+        "customers",
+        lambda: deep_bytes(customer_analytics.cached),
+        customer_analytics.clear,
+    )
+
+    def evict_pages():
+        # Serialized bodies are kept: they are what the routes serve
+        pages.clear()
+        for page_cache in [layout_cache, *page_caches.values()]:
+            page_cache.drop_encoded()
+
+    memory.watch(
+        "pages",
+        lambda: sum(c.nbytes() for c in [layout_cache, *page_caches.values()]),
+        evict_pages,
+    )
+    memory.watch("component bundles", static_cache_bytes, clear_static_cache)
+    memory.enforce()
+    dataset.on_change(memory.enforce)
+
+    # ======================================================
+    # ---------------- Register Callbacks -----------------
+    # ======================================================
+    register_callbacks(app, dataset, columns_to_show, app.layout())
+
+    # --- Callback latency / payload metrics on /metrics (Prometheus format,
+    # with SWIFTSHOP_METRICS=1) ---
+    install_metrics(app)
+
+    # --- Optional per-request stage traces (SWIFTSHOP_PROFILE=1) ---
+    install_profiling(app)
+
+    # --- Memory report on config.MEMORY_PATH (off unless set) ---
+    install_memory(app, memory)
+
+    # --- gzip / brotli responses (registered last, so it runs first and the
+    # metrics above record compressed sizes) ---
+    install_compression(app)
+
+    # --- Serialize the shell and every page up front ---
+    if preload:
+        layout_cache.get()
+        for page_cache in page_caches.values():
+            page_cache.get()
+
+    # --- Snapshot the prepared state in the background: the data, and the
+    # pages serialized so far (all of them with preload) ---
+    restored_pages = set(dataset.snapshot["pages"]) if dataset.snapshot else None
+    if restored_pages is None or (preload and restored_pages != set(page_caches)):
+        save_snapshot_in_background(dataset, page_caches)
+
+    return app
 
-# ======================================================
-# ------------------- App Layout ----------------------
-# ======================================================
-layout = create_layout(
-    df,
-    kpis,
-    columns_to_show,
-    fig_total_sales,
-    fig_avg_order,
-    fig_rating_dist,
-    fig_category_pie,
-    fig_category_sales_per_month,
-    fig_rating_pie,
-    fig_category_sales_pie
-)
-app.layout = layout
-# ======================================================
-# ---------------- Register Callbacks -----------------
-# ======================================================
-register_callbacks(app, df, columns_to_show, layout)
 
 # ======================================================
 # -------------------- Run Server ---------------------
 # ======================================================
+# Development server. In production use the preloading launcher: python wsgi.py
 if __name__ == "__main__":
-    app.run(debug=True)
+    create_app().run(debug=True)
 
 #   app.run(debug=True, use_reloader=False)
-#   app.run(debug=True, use_reloader=True)
\ No newline at end of file
+#   app.run(debug=True, use_reloader=True)
@@ -0,0 +1,79 @@
+// assets/clientside.js
+// ======================================================
+// ------------- Clientside Callbacks ------------------
+// ======================================================
+// UI-only interactions that run in the browser instead of as server callbacks.
+// Registered from modules/callbacks.py with dash.ClientsideFunction.
+
+const pages = {};         // route -> {etag, page} of the last page received
+const pageRequests = {};  // route -> request in flight
+
+function requestsPrefix() {
+    const config = document.getElementById("_dash-config");
+    return config ? JSON.parse(config.textContent).requests_pathname_prefix : "/";
+}
+
+window.dash_clientside = Object.assign({}, window.dash_clientside, {
+    ui: {
+        // --- Page navigation: revalidate the route's page, reuse it on a 304 ---
+        // Pages are built lazily on the server and served from cached bytes
+        // (with an ETag) by modules/layout_cache.py. After a dataset reload
+        // the ETag changes and the new page is downloaded.
+        display_page: function (pathname) {
+            const route = pathname || "/";
+            if (!pageRequests[route]) {
+                const cached = pages[route];
+                pageRequests[route] = fetch(
+                    requestsPrefix() + "_page?pathname=" + encodeURIComponent(route),
+                    {
+                        credentials: "same-origin",
+                        cache: "no-store",  // the ETag is handled here
+                        headers: cached ? {"If-None-Match": cached.etag} : {},
+                    }
+                ).then(function (response) {
+                    if (response.status === 304 && cached) {
+                        return cached.page;
+                    }
+                    if (!response.ok) {
+                        throw new Error("Page request failed: " + response.status);
+                    }
+                    return response.json().then(function (page) {
+                        const etag = response.headers.get("ETag");
+                        if (etag) {
+                            pages[route] = {etag: etag, page: page};
+                        }
+                        return page;
+                    });
+                }).finally(function () {
+                    delete pageRequests[route];  // next navigation revalidates
+                });
+            }
+            // Hand the renderer a fresh copy so cached pages are never mutated
+            return pageRequests[route].then(function (page) {
+                return JSON.parse(JSON.stringify(page));
+            });
+        },
+
+        // --- Mirror the filter values for callbacks on other pages ---
+        store_filters: function (
+            start_date, end_date, regions, categories, stores, products
+        ) {
+            return {
+                start_date: start_date,
+                end_date: end_date,
+                selected_regions: regions,
+                selected_categories: categories,
+                selected_stores: stores,
+                selected_products: products,
+            };
+        },
+
+        // --- Show / hide the filters panel ---
+        toggle_filters: function (n_clicks, current_style) {
+            if (n_clicks && current_style && current_style.display === "none") {
+                return {display: "block"};
+            }
+            return {display: "none"};
+        },
+    },
+});
@@ -0,0 +1,372 @@
+# loadtest.py
+# ======================================================
+# ------------- Callback Load Test --------------------
+# ======================================================
+# Simulates analysts working with the dashboard filters: concurrent requests
+# to /_dash-update-component with random date / region / category / store /
+# product filters, for the filter page outputs, the KPI cards and the CSV
+# export.
+# Reports throughput, p50/p95/p99 latency and response sizes per callback.
+#
+# Without --url the app runs in this process and is called through the Flask
+# test client: one worker with --concurrency threads. With --url it drives a
+# running instance (python app.py, python wsgi.py, ...).
+#
+#   python loadtest.py                                   # in-process, 8 users, 30 s
+#   python loadtest.py --url http://127.0.0.1:8050 -c 32 -d 60 --gzip
+#   python loadtest.py --callbacks sales-line orders-table --json results.json
+#
+# Callbacks and filter choices are discovered from the app itself
+# (/_dash-dependencies, the filters page and the product search callback), so
+# payloads match its layout.
+
+import argparse
+import itertools
+import json
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+UPDATE_PATH = "_dash-update-component"
+
+# First output id of each callback exercised by default
+DEFAULT_CALLBACKS = [
+    "sales-line",
+    "top-products",
+    "orders-table",
+    "kpi-total-sales",
+    "download-dataframe-csv",
+]
+
+# Filter dropdowns and the filter field they set
+DROPDOWNS = {
+    "region-dropdown": "selected_regions",
+    "category-dropdown": "selected_categories",
+    "store-dropdown": "selected_stores",
+    "product-dropdown": "selected_products",  # search-fed: no options in the page
+}
+# At most this many values picked per filter (default: any number of options)
+MAX_PICKED = {"selected_products": 3}
+# Product searches collecting the product choices (ids and name words)
+PRODUCT_QUERIES = [*"123456789", *"abcdefghijklmnopqrstuvwxyz"]
+
+
+# ======================================================
+# ---------------- Clients ----------------------------
+# ======================================================
+class HttpClient:
+    """A running instance, one HTTP session per thread."""
+
+    def __init__(self, url, gzip=False):
+        import requests
+
+        self._requests = requests
+        self.url = url.rstrip("/") + "/"
+        self.headers = {"Accept-Encoding": "gzip" if gzip else "identity"}
+        self._local = threading.local()
+
+    def _session(self):
+        if not hasattr(self._local, "session"):
+            self._local.session = self._requests.Session()
+        return self._local.session
+
+    def get_json(self, path):
+        response = self._session().get(self.url + path)
+        response.raise_for_status()
+        return response.json()
+
+    def post(self, path, body):
+        """(status, response bytes as sent over the wire)"""
+        response = self._session().post(
+            self.url + path, json=body, headers=self.headers, stream=True
+        )
+        return response.status_code, len(response.raw.read(decode_content=False))
+
+    def post_json(self, path, body):
+        response = self._session().post(self.url + path, json=body)
+        response.raise_for_status()
+        return response.json() if response.content else None
+
+
+class TestClient:
+    """The app in this process, through one Flask test client per thread."""
+
+    def __init__(self, app, gzip=False):
+        self.app = app
+        self.headers = {"Accept-Encoding": "gzip" if gzip else "identity"}
+        self._local = threading.local()
+
+    def _client(self):
+        if not hasattr(self._local, "client"):
+            self._local.client = self.app.server.test_client()
+        return self._local.client
+
+    def get_json(self, path):
+        response = self._client().get("/" + path)
+        if response.status_code != 200:
+            raise RuntimeError(f"GET /{path} failed: {response.status_code}")
+        return response.get_json()
+
+    def post(self, path, body):
+        response = self._client().post("/" + path, json=body, headers=self.headers)
+        return response.status_code, len(response.get_data())
+
+    def post_json(self, path, body):
+        response = self._client().post("/" + path, json=body)
+        if response.status_code not in (200, 204):
+            raise RuntimeError(f"POST /{path} failed: {response.status_code}")
+        return response.get_json(silent=True)
+
+
+# ======================================================
+# ---------------- Payloads ---------------------------
+# ======================================================
+def _walk(component):
+    """Every component dict in a serialized layout tree."""
+    if isinstance(component, list):
+        for child in component:
+            yield from _walk(child)
+    elif isinstance(component, dict):
+        if "props" in component:
+            yield component
+            yield from _walk(component["props"].get("children"))
+        else:
+            for value in component.values():
+                yield from _walk(value)
+
+
+def filter_choices(page):
+    """Date bounds and dropdown options from the serialized filters page."""
+    props = {
+        c["props"]["id"]: c["props"]
+        for c in _walk(page)
+        if isinstance(c["props"].get("id"), str)
+    }
+    dates = props.get("date-picker", {})
+    choices = {
+        "first_date": dates.get("min_date_allowed"),
+        "last_date": dates.get("max_date_allowed"),
+    }
+    for dropdown, field in DROPDOWNS.items():
+        options = props.get(dropdown, {}).get("options") or []
+        choices[field] = [
+            option["value"] if isinstance(option, dict) else option for option in options
+        ]
+    return choices
+
+
+def product_choices(client, dependency):
+    """
+    Product ids found through the product search callback (dependency), since
+    the product dropdown lists no options until something is searched.
+    """
+    products = {}
+    for query in PRODUCT_QUERIES:
+        response = client.post_json(
+            UPDATE_PATH,
+            {
+                "output": dependency["output"],
+                "outputs": _output_spec(dependency["output"]),
+                "inputs": [{**spec, "value": query} for spec in dependency["inputs"]],
+                "state": [{**spec, "value": None} for spec in dependency["state"]],
+                "changedPropIds": ["product-dropdown.search_value"],
+            },
+        )
+        options = (response or {}).get("response", {}).get("product-dropdown", {})
+        for option in options.get("options") or []:
+            products[option["value"]] = None
+    return list(products)
+
+
+def random_filters(rng, choices):
+    """Filter values an analyst might pick; any filter may be left empty."""
+    filters = {"start_date": None, "end_date": None}
+    if choices["first_date"] and choices["last_date"] and rng.random() < 0.8:
+        first = pd.Timestamp(choices["first_date"])
+        days = (pd.Timestamp(choices["last_date"]) - first).days
+        start = rng.randint(0, days)
+        end = rng.randint(start, days)
+        filters["start_date"] = (first + pd.Timedelta(days=start)).strftime("%Y-%m-%d")
+        filters["end_date"] = (first + pd.Timedelta(days=end)).strftime("%Y-%m-%d")
+    for field in DROPDOWNS.values():
+        options = choices[field]
+        most = min(len(options), MAX_PICKED.get(field, len(options)))
+        picked = rng.sample(options, rng.randint(0, most)) if options else []
+        filters[field] = picked or None
+    return filters
+
+
+def _prop_value(component_id, prop, filters, rng):
+    if component_id == "date-picker":
+        return filters[prop]
+    if component_id in DROPDOWNS:
+        return filters[DROPDOWNS[component_id]]
+    if (component_id, prop) == ("filter-state", "data"):
+        return filters
+    if (component_id, prop) == ("orders-table", "page_current"):
+        return rng.randint(0, 3)
+    if (component_id, prop) == ("orders-table", "page_size"):
+        return 10
+    if prop in ("n_clicks", "n_intervals"):
+        return 1
+    return None
+
+
+def _output_spec(output):
+    """The "outputs" field for a callback output string ("..a.x...b.y.." = multi)."""
+    specs = [
+        dict(zip(("id", "property"), part.rsplit(".", 1)))
+        for part in output.strip(".").split("...")
+    ]
+    return specs if output.startswith("..") else specs[0]
+
+
+def _first_output_id(output):
+    return output.strip(".").split("...")[0].rsplit(".", 1)[0]
+
+
+def callback_payload(dependency, filters, rng):
+    """Request body for one server callback with the given filter values."""
+    inputs = [
+        {**spec, "value": _prop_value(spec["id"], spec["property"], filters, rng)}
+        for spec in dependency["inputs"]
+    ]
+    state = [
+        {**spec, "value": _prop_value(spec["id"], spec["property"], filters, rng)}
+        for spec in dependency["state"]
+    ]
+    return {
+        "output": dependency["output"],
+        "outputs": _output_spec(dependency["output"]),
+        "inputs": inputs,
+        "state": state,
+        "changedPropIds": ["{id}.{property}".format(**inputs[0])] if inputs else [],
+    }
+
+
+# ======================================================
+# ---------------- Run and Report ---------------------
+# ======================================================
+def run(client, callbacks, concurrency, duration, max_requests=None, seed=None):
+    """
+    Send requests from `concurrency` simulated users for `duration` seconds
+    (or until max_requests). Returns (results, elapsed seconds), results being
+    (callback, seconds, bytes, status) per request.
+    """
+    dependencies = {
+        _first_output_id(dep["output"]): dep
+        for dep in client.get_json("_dash-dependencies")
+        if not dep.get("clientside_function")
+    }
+    missing = [name for name in callbacks if name not in dependencies]
+    if missing:
+        raise SystemExit(f"Unknown callbacks: {', '.join(missing)}")
+    choices = filter_choices(client.get_json("_page?pathname=/filters"))
+    if "product-dropdown" in dependencies and not choices["selected_products"]:
+        choices["selected_products"] = product_choices(
+            client, dependencies["product-dropdown"]
+        )
+
+    results = []
+    lock = threading.Lock()
+    sent = itertools.count()
+    start = time.perf_counter()
+    deadline = start + duration
+
+    def user(number):
+        rng = random.Random(None if seed is None else seed + number)
+        while time.perf_counter() < deadline:
+            if max_requests and next(sent) >= max_requests:
+                return
+            name = rng.choice(callbacks)
+            filters = random_filters(rng, choices)
+            body = callback_payload(dependencies[name], filters, rng)
+            request_start = time.perf_counter()
+            status, size = client.post(UPDATE_PATH, body)
+            seconds = time.perf_counter() - request_start
+            with lock:
+                results.append((name, seconds, size, status))
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        users = [pool.submit(user, number) for number in range(concurrency)]
+        for finished in users:
+            finished.result()  # re-raise a user's exception
+    return results, time.perf_counter() - start
+
+
+def summarize(results, elapsed):
+    """Per-callback and overall throughput, latency percentiles and sizes."""
+    frame = pd.DataFrame(results, columns=["callback", "seconds", "bytes", "status"])
+    rows = []
+    for name, group in [*frame.groupby("callback"), ("ALL", frame)]:
+        if group.empty:
+            continue
+        latency_ms = group["seconds"].to_numpy() * 1000
+        p50, p95, p99 = np.percentile(latency_ms, [50, 95, 99])
+        rows.append(
+            {
+                "callback": name,
+                "requests": len(group),
+                "errors": int((group["status"] >= 400).sum()),
+                "req_per_s": len(group) / elapsed,
+                "p50_ms": p50,
+                "p95_ms": p95,
+                "p99_ms": p99,
+                "max_ms": latency_ms.max(),
+                "mean_bytes": group["bytes"].mean(),
+                "max_bytes": group["bytes"].max(),
+            }
+        )
+    return pd.DataFrame(rows)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test the dashboard callbacks.")
+    parser.add_argument("--url", help="running instance (default: in-process app)")
+    parser.add_argument("-c", "--concurrency", type=int, default=8, help="users")
+    parser.add_argument("-d", "--duration", type=float, default=30, help="seconds")
+    parser.add_argument("-n", "--requests", type=int, help="stop after N requests")
+    parser.add_argument(
+        "--callbacks",
+        nargs="+",
+        default=DEFAULT_CALLBACKS,
+        help="first output id of each callback to call",
+    )
+    parser.add_argument("--gzip", action="store_true", help="accept gzip responses")
+    parser.add_argument("--seed", type=int, help="seed for repeatable filters")
+    parser.add_argument("--json", help="also write the summary to this file")
+    args = parser.parse_args()
+
+    if args.url:
+        client = HttpClient(args.url, gzip=args.gzip)
+    else:
+        from app import create_app
+
+        client = TestClient(create_app(preload=True), gzip=args.gzip)
+
+    results, elapsed = run(
+        client,
+        args.callbacks,
+        args.concurrency,
+        args.duration,
+        max_requests=args.requests,
+        seed=args.seed,
+    )
+    summary = summarize(results, elapsed)
+
+    print(
+        f"{len(results)} requests in {elapsed:.1f} s "
+        f"from {args.concurrency} concurrent users\n"
+    )
+    print(summary.to_string(index=False, float_format=lambda value: f"{value:,.1f}"))
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as summary_file:
+            json.dump(summary.to_dict("records"), summary_file, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+# modules/aggregates.py
+# ======================================================
+# ---------------- KPI Aggregate Cube -----------------
+# ======================================================
+# Orders pre-aggregated per (year, month, region, category). Every dashboard
+# filter works at that grain, so filtered KPI totals are a sum over a few
+# cube rows instead of a rescan of the order table.
+
+import numpy as np
+import pandas as pd
+
+from modules.metrics import timed
+
+CUBE_KEYS = ["year", "month", "customer_region", "category"]
+
+
+@timed("build_kpi_cube")
+def build_kpi_cube(df):
+    """Sum of sales, order count and rating sum/count per cube cell."""
+    keys = [key for key in CUBE_KEYS if key in df.columns]
+    if df.empty or not keys:
+        return pd.DataFrame(
+            columns=CUBE_KEYS
+            + ["total_amount", "amount_count", "orders", "rating_sum", "rating_count"]
+            + ["period_key"]
+        )
+
+    ratings = (
+        df["customer_rating"]
+        if "customer_rating" in df.columns
+        else pd.Series(np.nan, index=df.index)
+    )
+    cube = (
+        df.assign(
+            amount_count=df["total_amount"].notna().astype(int),
+            orders=1,
+            rating_sum=ratings.fillna(0),
+            rating_count=ratings.notna().astype(int),
+        )
+        .groupby(keys, as_index=False, dropna=False, observed=True)[
+            ["total_amount", "amount_count", "orders", "rating_sum", "rating_count"]
+        ]
+        .sum()
+    )
+    # month key (year * 12 + month) for the date filter; NaN for missing dates
+    cube["period_key"] = cube["year"] * 12 + cube["month"]
+    return cube
+
+
+def cube_mask(
+    cube, start_date=None, end_date=None, selected_regions=None, selected_categories=None
+):
+    """
+    Cube rows matching the dashboard filters, as a boolean array.
+
+    Same semantics as filters.filter_orders: dates are compared by month.
+    """
+    mask = np.ones(len(cube), dtype=bool)
+
+    # --- Date Filter ---
+    if start_date and end_date:
+        start_date = pd.to_datetime(start_date)
+        end_date = pd.to_datetime(end_date)
+        period_key = cube["period_key"].to_numpy(dtype=float)
+        mask &= (period_key >= start_date.year * 12 + start_date.month) & (
+            period_key <= end_date.year * 12 + end_date.month
+        )
+
+    # --- Region Filter ---
+    if selected_regions:
+        mask &= cube["customer_region"].isin(selected_regions).to_numpy()
+
+    # --- Category Filter ---
+    if selected_categories:
+        mask &= cube["category"].isin(selected_categories).to_numpy()
+
+    return mask
+
+
+def kpi_totals(cube, *filters):
+    """KPI totals for the dashboard filters, computed from the cube."""
+    selected = cube[cube_mask(cube, *filters)]
+    total_sales = selected["total_amount"].sum()
+    amount_count = selected["amount_count"].sum()
+    rating_count = selected["rating_count"].sum()
+
+    return {
+        "total_sales": total_sales,
+        "total_orders": int(selected["orders"].sum()),
+        "avg_order_value": total_sales / amount_count if amount_count else 0,
+        "avg_rating": selected["rating_sum"].sum() / rating_count if rating_count else None,
+    }
+
+
+def monthly_totals(cube, *filters):
+    """Sales and orders per (year, month) for the dashboard filters (month grain)."""
+    selected = cube[cube_mask(cube, *filters)]
+    monthly = selected.groupby(["year", "month"], as_index=False)[
+        ["total_amount", "orders"]
+    ].sum()
+    return monthly.astype({"year": int, "month": int})
@@ -0,0 +1,196 @@
+# modules/anomalies.py
+# ======================================================
+# ---------------- Anomaly Detection ------------------
+# ======================================================
+# Daily sales and order counts, in total and per region and category, are
+# scored against an exponentially weighted mean and variance (EWMA z-score).
+# With a season (7 = weekly), a day is compared with the same weekday's EWMA
+# once that has enough history, and with the overall EWMA until then.
+#
+# Every series only keeps its running state and the last day it has seen, so
+# after a reload just the rows from that day on are grouped and fed: O(1)
+# work per new day and series instead of a pass over the whole history. Only
+# completed days are fed (the current one is still growing), and days
+# without orders in a series count as zero sales and orders, so an outage
+# scores and the weekday slots stay aligned.
+
+import math
+import threading
+
+import numpy as np
+import pandas as pd
+
+from modules import config
+from modules.metrics import ANOMALIES
+
+# --- Daily aggregate tables (see kpi_calculations.finalize_kpis) ---
+DAILY_TABLES = {
+    "daily_totals": None,  # whole shop
+    "daily_by_region": "customer_region",
+    "daily_by_category": "category",
+}
+SERIES_METRICS = {"total_amount": "Sales (SAR)", "orders": "Orders"}
+ANOMALY_COLUMNS = [
+    "order_date",
+    "dimension",
+    "member",
+    "metric",
+    "value",
+    "expected",
+    "z",
+]
+
+
+class Ewma:
+    """Exponentially weighted mean and variance of one stream of values."""
+
+    __slots__ = ("alpha", "mean", "var", "count")
+
+    def __init__(self, alpha):
+        self.alpha = alpha
+        self.mean = 0.0
+        self.var = 0.0
+        self.count = 0
+
+    def score(self, value):
+        """z-score of value, or None while the stream has too little history."""
+        if self.count < config.ANOMALY_WARMUP or self.var <= 0:
+            return None
+        return (value - self.mean) / math.sqrt(self.var)
+
+    def update(self, value):
+        if self.count == 0:
+            self.mean = value
+        else:
+            diff = value - self.mean
+            increment = self.alpha * diff
+            self.mean += increment
+            self.var = (1 - self.alpha) * (self.var + diff * increment)
+        self.count += 1
+
+
+class SeriesState:
+    """Running state of one (dimension, member, metric) series."""
+
+    def __init__(self, halflife, season):
+        self.overall = Ewma(1 - 0.5 ** (1 / halflife))
+        # Same half-life in days for the per-weekday streams
+        self.seasonal = [Ewma(1 - 0.5 ** (season / halflife)) for _ in range(season)]
+        self.last_day = None  # day number of the last value fed
+        self.last_value = None  # that value, to notice rewritten history
+        self.anomalies = []
+
+
+class AnomalyDetector:
+    """Streaming EWMA z-score detector over the daily KPI aggregates."""
+
+    def __init__(self, threshold=None, halflife=None, season=None):
+        self.threshold = threshold or config.ANOMALY_Z
+        self.halflife = halflife or config.ANOMALY_HALFLIFE_DAYS
+        self.season = season or config.ANOMALY_SEASON
+        self._series = {}
+        self._fed_through = {}  # dimension -> last day fed to its series
+        self._lock = threading.Lock()
+
+    def update(self, kpis, today=None):
+        """Feed the completed days not seen yet of every daily series in kpis."""
+        today = pd.Timestamp.now() if today is None else pd.Timestamp(today)
+        today = np.datetime64(today.normalize(), "D").astype(np.int64)
+        with self._lock:
+            for table, dimension in DAILY_TABLES.items():
+                daily = kpis.get(table)
+                if daily is None or daily.empty:
+                    continue
+                name = dimension or "total"
+                if not self._update_dimension(name, dimension, daily, today):
+                    # A reload rewrote days already fed: start the series over
+                    for key in [key for key in self._series if key[0] == name]:
+                        del self._series[key]
+                    self._fed_through.pop(name, None)
+                    self._update_dimension(name, dimension, daily, today)
+
+    def _update_dimension(self, name, dimension, daily, today):
+        """Feed one daily table; False when it no longer matches what was fed."""
+        days = daily["order_date"].to_numpy(dtype="datetime64[D]").astype(np.int64)
+        complete = days < today
+        if not complete.any():
+            return True
+        last = int(days[complete].max())
+        fed_through = self._fed_through.get(name)
+        if fed_through is not None:
+            if last < fed_through:
+                return False
+            # The last day fed (to check it) and the days after it
+            complete &= days >= fed_through
+        rows = daily[complete].assign(day=days[complete])
+
+        members = (
+            {"All": rows}
+            if dimension is None
+            else dict(list(rows.groupby(dimension, sort=True, observed=True)))
+        )
+        known = {key[1] for key in self._series if key[0] == name}
+        for member in sorted(known | set(members), key=str):
+            member_rows = members.get(member)
+            for metric in SERIES_METRICS:
+                if metric not in daily.columns:
+                    continue
+                key = (name, member, metric)
+                state = self._series.get(key)
+                first = state.last_day if state else int(member_rows["day"].min())
+                # One value per day up to the last completed one, 0 without orders
+                values = np.zeros(last - first + 1)
+                if member_rows is not None:
+                    member_days = member_rows["day"].to_numpy()
+                    values[member_days - first] = member_rows[metric].to_numpy(
+                        dtype=np.float64
+                    )
+                if not self._feed(key, first, values):
+                    return False
+        self._fed_through[name] = last
+        return True
+
+    def _feed(self, key, first, values):
+        """
+        Feed the values of consecutive days from day number `first`. A known
+        series starts at its last day fed, whose value is only checked: False
+        when a reload changed it.
+        """
+        state = self._series.get(key)
+        skip = 0
+        if state is not None:
+            if not math.isclose(
+                values[0], state.last_value, rel_tol=1e-9, abs_tol=1e-6
+            ):
+                return False
+            skip = 1
+        else:
+            state = self._series[key] = SeriesState(self.halflife, self.season)
+        streaming = state.last_day is not None  # not the initial backfill
+
+        for day, value in enumerate(values[skip:].tolist(), start=first + skip):
+            seasonal = state.seasonal[day % self.season]
+            reference = (
+                seasonal if seasonal.count >= config.ANOMALY_WARMUP else state.overall
+            )
+            z = reference.score(value)
+            if z is not None and abs(z) >= self.threshold:
+                state.anomalies.append((day, *key, value, reference.mean, z))
+                if streaming:
+                    ANOMALIES.inc(dimension=key[0], metric=key[2])
+            state.overall.update(value)
+            seasonal.update(value)
+            state.last_day = day
+            state.last_value = value
+        return True
+
+    @property
+    def anomalies(self):
+        """Every anomaly found so far, one row per day and series."""
+        with self._lock:
+            rows = [row for state in self._series.values() for row in state.anomalies]
+        anomalies = pd.DataFrame(rows, columns=ANOMALY_COLUMNS)
+        anomalies["order_date"] = pd.to_datetime(
+            anomalies["order_date"].astype("int64"), unit="D"
+        )
+        return anomalies.sort_values(["order_date", "dimension", "member"])
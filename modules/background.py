@@ -0,0 +1,65 @@
+# modules/background.py
+# ======================================================
+# ---------- Background Callback Execution ------------
+# ======================================================
+# Optional: heavy callbacks run as Dash background callbacks so a slow
+# query never holds a request thread. When a callback is triggered again
+# while its previous job is still running, Dash terminates the old job.
+
+import functools
+
+from modules import config
+
+
+def create_background_manager():
+    """Return a DiskcacheManager when background callbacks are enabled, else None."""
+    if not config.BACKGROUND_CALLBACKS:
+        return None
+
+    try:
+        import diskcache
+        from dash import DiskcacheManager
+    except ImportError as missing:
+        raise ImportError(
+            "SWIFTSHOP_BACKGROUND_CALLBACKS requires extra dependencies:\n\n"
+            '    pip install "dash[diskcache]"\n'
+        ) from missing
+
+    cache = diskcache.Cache(config.BACKGROUND_CACHE_DIR)
+    return DiskcacheManager(cache)
+
+
+def heavy_callback(app, *dependencies, progress=None, running=None, cancel=None, **kwargs):
+    """
+    Register a callback that runs in the background when enabled.
+
+    With `progress`, the decorated function takes `set_progress` as its first
+    argument; in regular (foreground) mode it receives a no-op instead, so the
+    function body is the same in both modes.
+    """
+
+    def decorator(func):
+        if config.BACKGROUND_CALLBACKS:
+            return app.callback(
+                *dependencies,
+                background=True,
+                progress=progress,
+                running=running,
+                cancel=cancel,
+                **kwargs,
+            )(func)
+
+        if progress is None:
+            return app.callback(*dependencies, **kwargs)(func)
+
+        @functools.wraps(func)
+        def foreground(*args):
+            return func(_no_progress, *args)
+
+        return app.callback(*dependencies, **kwargs)(foreground)
+
+    return decorator
+
+
+def _no_progress(*_):
+    pass
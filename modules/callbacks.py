@@ -1,255 +1,365 @@
 import dash
-from dash import Input, Output, State, dcc
+from dash import ClientsideFunction, Input, Output, Patch, State, ctx, dcc
+from dash.exceptions import PreventUpdate
 import pandas as pd
-import plotly.express as px
-import plotly.graph_objects as go
 
-from modules.style import CHART_LAYOUT
+from modules import style
+from modules.background import heavy_callback
+from modules.charts import category_rollup_chart, time_series_points, typed_array
+from modules.comparisons import (
+    compare_periods,
+    last_twelve_months,
+    month_starts,
+    period_window,
+    window_change,
+)
+from modules.filters import FILTER_FIELDS
+from modules.kpi_calculations import format_change, format_kpis
+from modules.metrics import CACHE_REQUESTS
+from modules.profiling import stage
+from modules.rollups import DEFAULT_GRAIN, coarser_grain, finer_grain, period_end
+from modules.search import ProductSearch
 
 
-def register_callbacks(app, df, columns_to_show, layout):
+def register_callbacks(app, dataset, columns_to_show, layout):
     # ======================================================
     # ------------- Page Navigation Callback --------------
     # ======================================================
-    @app.callback(Output("page-content", "children"), Input("url", "pathname"))
-    def display_page(pathname):
-        return layout.page_dict.get(pathname, layout.page_dict["/"])
+    # Runs in the browser (assets/clientside.js): each page is fetched once
+    # from the cached /_page endpoint and swapped in without a callback.
+    app.clientside_callback(
+        ClientsideFunction(namespace="ui", function_name="display_page"),
+        Output("page-content", "children"),
+        Input("url", "pathname"),
+    )
 
     # ======================================================
     # ------------- Dashboard Filters Callback -----------
     # ======================================================
-    @app.callback(
+    app.clientside_callback(
+        ClientsideFunction(namespace="ui", function_name="toggle_filters"),
         Output("filters-div", "style"),
         Input("toggle-filters", "n_clicks"),
         State("filters-div", "style"),
     )
-    def toggle_filters(n_clicks, current_style):
-        if n_clicks:
-            if current_style and current_style.get("display") == "none":
-                return {"display": "block"}
-        else:
-            return {"display": "none"}
-        return {"display": "none"}
+
+    # Product options are searched in a prefix index (modules/search.py)
+    # instead of listing the whole catalog; selected products stay listed.
+    product_search = ProductSearch(dataset)
+    CACHE_REQUESTS.watch("product_index", product_search)
 
     @app.callback(
-        Output("sales-line", "figure"),
-        Output("top-products", "figure"),
-        Output("orders-table", "data"),
-        Output("filtered-data", "data"),
+        Output("product-dropdown", "options"),
+        Input("product-dropdown", "search_value"),
+        State("product-dropdown", "value"),
+    )
+    def search_products(search_value, selected):
+        if not search_value and not selected:
+            raise PreventUpdate
+        with stage("search"):
+            index = product_search.get()
+            found = [product_id for product_id, _ in index.search(search_value or "")]
+        selected = selected or []
+        return index.options(selected + [p for p in found if p not in selected])
+
+    # ======================================================
+    # ------------- Time Series Zoom Callbacks -----------
+    # ======================================================
+    # The home page lines are downsampled; zooming re-requests the visible
+    # range at full detail (again capped by the point budget).
+    def register_zoom_detail(graph_id, series_name):
+        @app.callback(
+            Output(graph_id, "figure"),
+            Input(graph_id, "relayoutData"),
+            prevent_initial_call=True,
+        )
+        def zoom_detail(relayout_data):
+            x_range = zoom_range(relayout_data)
+            if x_range is None:
+                return dash.no_update
+
+            with stage("downsample"):
+                x, y, trace_type = time_series_points(
+                    dataset.kpis[series_name], x_range or None
+                )
+            fig = Patch()
+            fig["data"][0]["x"] = typed_array(x)
+            fig["data"][0]["y"] = typed_array(y)
+            fig["data"][0]["type"] = trace_type
+            return fig
+
+    register_zoom_detail("total-sales-chart", "sales_over_time")
+    register_zoom_detail("avg-order-chart", "avg_order_daily")
+
+    # ======================================================
+    # ------------- Category Sales Drill-down ------------
+    # ======================================================
+    # Clicking a bar shows the next finer grain within that period; "Up" goes
+    # back a step (and above the full quarters, to years). Every view is a
+    # slice of a precomputed time rollup (modules/rollups.py).
+    @app.callback(
+        Output("category-rollup-chart", "figure"),
+        Output("rollup-views", "data"),
+        Input("category-rollup-chart", "clickData"),
+        Input("rollup-up", "n_clicks"),
+        State("rollup-views", "data"),
+        prevent_initial_call=True,
+    )
+    def drill_category_sales(click_data, up_clicks, views):
+        views = list(views or [{"grain": DEFAULT_GRAIN}])
+        grain = views[-1]["grain"]
+
+        if ctx.triggered_id == "rollup-up":
+            if len(views) > 1:
+                views.pop()
+            elif coarser_grain(grain):
+                views = [{"grain": coarser_grain(grain)}]
+            else:
+                return dash.no_update, dash.no_update
+        else:
+            points = (click_data or {}).get("points") or [{}]
+            clicked = points[0].get("customdata")
+            if finer_grain(grain) is None or not clicked:
+                return dash.no_update, dash.no_update
+            start = pd.Timestamp(clicked)
+            views.append(
+                {
+                    "grain": finer_grain(grain),
+                    "parent": grain,
+                    "start": start.strftime("%Y-%m-%d"),
+                    "end": period_end(grain, start).strftime("%Y-%m-%d"),
+                }
+            )
+
+        with stage("rollup"):
+            fig = category_rollup_chart(dataset.kpis.get("rollups", {}), views[-1])
+        return fig, views
+
+    # ======================================================
+    # ------------- Live KPI Cards Callback --------------
+    # ======================================================
+    # The latest filter values are mirrored into "filter-state" in the browser
+    app.clientside_callback(
+        ClientsideFunction(namespace="ui", function_name="store_filters"),
+        Output("filter-state", "data"),
         Input("date-picker", "start_date"),
         Input("date-picker", "end_date"),
         Input("region-dropdown", "value"),
         Input("category-dropdown", "value"),
+        Input("store-dropdown", "value"),
+        Input("product-dropdown", "value"),
     )
-    def update_dashboard(start_date, end_date, selected_regions, selected_categories):
-        filtered_df = df.copy()
-
-        # --- Date Filter ---
-        if start_date and end_date and "year" in df.columns and "month" in df.columns:
-            start_date = pd.to_datetime(start_date)
-            end_date = pd.to_datetime(end_date)
-            filtered_df = filtered_df[
-                (
-                    (df["year"] > start_date.year)
-                    | (
-                        (df["year"] == start_date.year)
-                        & (df["month"] >= start_date.month)
-                    )
-                )
-                & (
-                    (df["year"] < end_date.year)
-                    | ((df["year"] == end_date.year) & (df["month"] <= end_date.month))
-                )
-            ]
 
-        # --- Region Filter ---
-        if selected_regions and "customer_region" in filtered_df.columns:
-            filtered_df = filtered_df[
-                filtered_df["customer_region"].isin(selected_regions)
-            ]
+    # Totals come from the pre-aggregated KPI cubes, never from a scan of the
+    # orders. Changed source files are reloaded by a background thread (see
+    # app.py); interval ticks only compare the dataset version and push values
+    # when it changed.
+    # Sales and orders are compared with the same months last year (the last
+    # twelve months when no date range is selected).
+    @app.callback(
+        Output("kpi-total-sales", "children"),
+        Output("kpi-total-orders", "children"),
+        Output("kpi-avg-order-value", "children"),
+        Output("kpi-avg-rating", "children"),
+        Output("kpi-sales-yoy", "children"),
+        Output("kpi-orders-yoy", "children"),
+        Output("kpi-version", "data"),
+        Input("kpi-refresh", "n_intervals"),
+        Input("filter-state", "data"),
+        State("kpi-version", "data"),
+    )
+    def update_kpi_cards(n_intervals, filters, shown_version):
+        if ctx.triggered_id == "kpi-refresh" and shown_version == dataset.version:
+            return (dash.no_update,) * 7
 
-        # --- Category Filter ---
-        if selected_categories and "category" in filtered_df.columns:
-            filtered_df = filtered_df[filtered_df["category"].isin(selected_categories)]
+        filters = filters or {}
+        with stage("kpi_totals"):
+            cards = format_kpis(**dataset.kpi_totals(**filters))
 
-        # --- Sales Over Time Chart ---
-        if (
-            not filtered_df.empty
-            and "year" in filtered_df.columns
-            and "month" in filtered_df.columns
-        ):
-            sales_over_time = filtered_df.groupby(["year", "month"], as_index=False)[
-                "total_amount"
-            ].sum()
-            sales_over_time["period"] = (
-                sales_over_time["year"].astype(str)
-                + "-"
-                + sales_over_time["month"].astype(str)
-            )
-            sales_over_time["MoM_change"] = (
-                sales_over_time["total_amount"].pct_change() * 100
-            )
-            sales_over_time["YoY_change"] = (
-                sales_over_time["total_amount"].pct_change(12) * 100
+        with stage("compare"):
+            compared = monthly_comparisons(filters, ["total_amount", "orders"])
+            start, end = filters.get("start_date"), filters.get("end_date")
+            trailing = not (start and end)
+            if trailing and not compared.empty:
+                start, end = last_twelve_months(compared)
+            window = period_window(compared, "month", start, end)
+            sales_yoy, orders_yoy = (
+                format_change(window_change(window, value)[2], trailing)
+                for value in ("total_amount", "orders")
             )
 
-            # --- Base figure ---
-            fig_line = go.Figure()
-
-            # Bar for Total Sales
-            fig_line.add_trace(
-                go.Bar(
-                    x=sales_over_time["period"],
-                    y=sales_over_time["total_amount"],
-                    name="Total Sales",
-                    marker_color="#5879FF",
-                    hovertemplate="Sales: %{y:,.2f}<extra></extra>",
-                    marker=dict(cornerradius="15%"),
-                )
-            )
+        return (
+            cards["total_sales"],
+            cards["total_orders"],
+            cards["avg_order_value"],
+            cards["avg_rating"],
+            sales_yoy,
+            orders_yoy,
+            dataset.version,
+        )
 
-            # Line for MoM change
-            fig_line.add_trace(
-                go.Scatter(
-                    x=sales_over_time["period"],
-                    y=sales_over_time["MoM_change"],
-                    mode="lines+markers",
-                    name="Month over Month Change",
-                    yaxis="y2",
-                    hovertemplate="%{y:.2f}%<extra></extra>",
-                    line_shape="spline",
-                    line=dict(color="#D9B5C1"),
-                )
-            )
-            # Line for YoY change
-            fig_line.add_trace(
-                go.Scatter(
-                    x=sales_over_time["period"],
-                    y=sales_over_time["YoY_change"],
-                    mode="lines+markers",
-                    name="Year over Year Change",
-                    yaxis="y2",
-                    hovertemplate="%{y:.2f}%<extra></extra>",
-                    line_shape="spline",
-                    line=dict(color="#A66DD4"),
-                )
-            )
+    def monthly_comparisons(filters, values=("total_amount",)):
+        """
+        MoM / YoY comparisons per month for the filters (see comparisons.py).
+        Built over every month, not only the selected date range, so the
+        first months of the range are still compared with the year before.
+        """
+        monthly = dataset.monthly_sales(
+            **{**filters, "start_date": None, "end_date": None}
+        )
+        return compare_periods(month_starts(monthly), "month", values)
+
+    # ======================================================
+    # ------------- Dashboard Outputs Callbacks ----------
+    # ======================================================
+    # Each output has its own callback so the charts render while the table
+    # is still being prepared. The queries run against the dataset: the
+    # in-memory backend shares one cached filtered selection between them,
+    # the SQLite backend pushes each one down as SQL.
+    CACHE_REQUESTS.watch("selection", dataset.selections)
 
-            # --- Layout with dual y-axis
-            line_layout = dict(CHART_LAYOUT)
-            line_layout.update(
-                title="Sales Growth",
-                xaxis_title="",
-                xaxis=dict(title=""),
-                yaxis=dict(title=""),
-                yaxis2=dict(
-                    title="",
-                    overlaying="y",
-                    side="right",
-                    showgrid=False,
-                ),
-                legend=dict(
-                    orientation="h",
-                    yanchor="bottom",
-                    y=1.05,
-                    xanchor="center",
-                    x=0.5,
-                ),
-                barmode="group",
+    filter_inputs = [
+        Input("date-picker", "start_date"),
+        Input("date-picker", "end_date"),
+        Input("region-dropdown", "value"),
+        Input("category-dropdown", "value"),
+        Input("store-dropdown", "value"),
+        Input("product-dropdown", "value"),
+    ]
+
+    @app.callback(Output("sales-line", "figure"), *filter_inputs)
+    def update_sales_growth(*filter_values):
+        filters = dict(zip(FILTER_FIELDS, filter_values))
+        with stage("query"):
+            # Every month of the range, months without sales as 0, each
+            # compared with the month before and the same month last year
+            sales_over_time = period_window(
+                monthly_comparisons(filters),
+                "month",
+                filters["start_date"],
+                filters["end_date"],
             )
-            fig_line.update_layout(**line_layout)
 
+        # --- Sales Over Time Chart ---
+        # Only the data arrays are sent; the figure skeleton from
+        # charts.sales_growth_chart() stays on the client.
+        fig_line = Patch()
+        if not sales_over_time.empty:
+            month = sales_over_time["period"].dt
+            periods = month.year.astype(str) + "-" + month.month.astype(str)
+            series = [
+                sales_over_time["total_amount"],  # Bar for Total Sales
+                sales_over_time["total_amount_change"],  # Line for MoM change
+                sales_over_time["total_amount_yoy"],  # Line for YoY change
+            ]
         else:
-            fig_line = go.Figure().update_layout(title="Total Sales Over Time")
+            periods = []
+            series = [[], [], []]
 
-        # --- Top Products Chart ---
-        if not filtered_df.empty and "product_name" in filtered_df.columns:
-            top_products = (
-                filtered_df.groupby("product_name", as_index=False)["total_amount"]
-                .sum()
-                .sort_values(by="total_amount", ascending=False)
-                .head(10)
-            )
+        with stage("figure"):
+            for i, values in enumerate(series):
+                fig_line["data"][i]["x"] = periods
+                fig_line["data"][i]["y"] = typed_array(values)
+
+        return fig_line
 
-            fig_top = px.bar(
-                top_products,
-                x="total_amount",
-                y="product_name",
-                orientation="h",  # horizontal bars
-                title="Top 10 Products by Sales",
-                hover_data={"total_amount": ":,.2f"},
+    @app.callback(Output("top-products", "figure"), *filter_inputs)
+    def update_top_products(*filter_values):
+        with stage("query"):
+            top_products = dataset.top_products(
+                10, **dict(zip(FILTER_FIELDS, filter_values))
             )
 
-            # Highest on top
-            fig_top.update_yaxes(categoryorder="total ascending")
-            fig_top.update_layout(**CHART_LAYOUT)
-
-            # Show total above bars
-            fig_top.update_traces(
-                text=top_products["total_amount"].astype(int),
-                texttemplate="%{text:,}",
-                textposition="outside",
-                marker=dict(
-                    color=[
-                        "#5246AB",
-                        "#5879FF",
-                        "#A66DD4",
-                        "#C2CFF3",
-                        "#D9B5C1",
-                        "#5246AB",
-                        "#5879FF",
-                        "#A66DD4",
-                        "#C2CFF3",
-                        "#D9B5C1",
-                    ],
-                    cornerradius="15%",
-                ),
+        # --- Top Products Chart ---
+        # Patches bars, labels and the x-axis range of charts.top_products_chart()
+        fig_top = Patch()
+        if not top_products.empty:
+            with stage("figure"):
+                fig_top["data"][0]["x"] = typed_array(top_products["total_amount"])
+                fig_top["data"][0]["y"] = top_products["product_name"]
+                # Show total above bars
+                fig_top["data"][0]["text"] = top_products["total_amount"].astype(int)
+                # Adjust x-axis for space above bars
+                fig_top["layout"]["xaxis"]["range"] = [
+                    0,
+                    top_products["total_amount"].max() * 1.25,
+                ]
+        else:
+            fig_top["data"][0]["x"] = []
+            fig_top["data"][0]["y"] = []
+            fig_top["data"][0]["text"] = []
+
+        return fig_top
+
+    # The table is paged on the server: only the visible page is sent.
+    # New filter values go back to the first page.
+    @heavy_callback(
+        app,
+        Output("orders-table", "data"),
+        Output("orders-table", "page_count"),
+        Output("orders-table", "page_current"),
+        *filter_inputs,
+        Input("orders-table", "page_current"),
+        State("orders-table", "page_size"),
+        progress=Output("dashboard-progress", "value"),
+        running=[
+            (
+                Output("dashboard-progress", "style"),
+                style.PROGRESS_VISIBLE,
+                style.PROGRESS_HIDDEN,
             )
+        ],
+        cancel=[Input("url", "pathname")],
+    )
+    def update_orders_table(set_progress, *values):
+        *filter_values, page_current, page_size = values
+        page = (page_current or 0) if ctx.triggered_id == "orders-table" else 0
 
-            # Adjust x-axis for space above bars
-            fig_top.update_layout(**CHART_LAYOUT)
-            fig_top.update_layout(
-                xaxis=dict(range=[0, top_products["total_amount"].max() * 1.25]),
-                yaxis=dict(title=""),
-                xaxis_title="",
+        set_progress(0)
+        with stage("query"):
+            page_df, total = dataset.orders_page(
+                page, page_size, **dict(zip(FILTER_FIELDS, filter_values))
             )
 
-        else:
-            fig_top = px.bar(title="Top 10 Products by Sales")
+        set_progress(50)
 
         # --- Orders Table Data ---
-        filtered_table_df = (
-            filtered_df.copy()
-            if not filtered_df.empty
-            else pd.DataFrame(columns=columns_to_show)
-        )
+        with stage("table"):
+            page_df = (
+                page_df.copy()
+                if not page_df.empty
+                else pd.DataFrame(columns=columns_to_show)
+            )
 
-        if "order_date" in filtered_table_df.columns:
-            filtered_table_df["order_date"] = pd.to_datetime(
-                filtered_table_df["order_date"]
-            ).dt.strftime("%Y-%m-%d")
+            if "order_date" in page_df.columns:
+                page_df["order_date"] = pd.to_datetime(
+                    page_df["order_date"]
+                ).dt.strftime("%Y-%m-%d")
 
-        return (
-            fig_line,
-            fig_top,
-            filtered_table_df.to_dict("records"),
-            filtered_df.to_dict("records"),
-        )
+        set_progress(100)
+        with stage("records"):
+            return (
+                page_df.to_dict("records"),
+                max(-(-total // page_size), 1),
+                page,
+            )
 
     # ======================================================
     # ------------- CSV Export Callback ------------------
     # ======================================================
-    @app.callback(
+    # Exports every order matching the current filter values
+    @heavy_callback(
+        app,
         Output("download-dataframe-csv", "data"),
         Input("btn_csv", "n_clicks"),
-        State("filtered-data", "data"),
+        State("filter-state", "data"),
         prevent_initial_call=True,
     )
-    def export_csv(n_clicks, data):
-        if not data:
+    def export_csv(n_clicks, filters):
+        dff = dataset.select(**(filters or {}))
+        if dff.empty:
             return dash.no_update
-        dff = pd.DataFrame(data)
-        dff = dff[columns_to_show]
+        dff = dff[columns_to_show].copy()
         if "order_date" in dff.columns:
             dff["order_date"] = pd.to_datetime(dff["order_date"]).dt.strftime(
                 "%Y-%m-%d"
@@ -257,3 +367,21 @@ def register_callbacks(app, df, columns_to_show, layout):
         return dcc.send_data_frame(
             dff.to_csv, "filtered_swiftshop_sales.csv", index=False
         )
+
+
+def zoom_range(relayout_data):
+    """
+    x-axis range from a dcc.Graph relayoutData event.
+
+    Returns [start, end] when zoomed, [] when the zoom was reset (autorange)
+    and None for events that don't change the x-axis.
+    """
+    if not relayout_data:
+        return None
+    if relayout_data.get("xaxis.autorange"):
+        return []
+    if "xaxis.range[0]" in relayout_data and "xaxis.range[1]" in relayout_data:
+        return [relayout_data["xaxis.range[0]"], relayout_data["xaxis.range[1]"]]
+    if "xaxis.range" in relayout_data:
+        return list(relayout_data["xaxis.range"])
+    return None
@@ -1,83 +1,173 @@
-import plotly.express as px
-from modules.style import CHART_LAYOUT, CHART_LINE_COLOR, CHART_MARKER_COLOR
+import base64
+import copy
+import functools
 
+import numpy as np
+import pandas as pd
+import plotly.graph_objects as go
+from modules import config
+from modules.anomalies import SERIES_METRICS
+from modules.downsample import downsample
+from modules.rollups import GRAIN_TITLES, period_label, rollup_rows
+from modules.style import (
+    CHART_ANOMALY_COLOR,
+    CHART_LAYOUT,
+    CHART_LINE_COLOR,
+    CHART_MARKER_COLOR,
+)
 
-def total_sales_chart(sales_over_time):
-    fig = px.line(
-        sales_over_time,
-        x="order_date",
-        y="total_amount",
-        title="Total Sales Over Time",
-        markers=True,
-        labels={"order_date": "Date", "total_amount": "Sales (SAR)"},
-    )
-    fig.update_traces(line_color=CHART_LINE_COLOR, marker_color=CHART_MARKER_COLOR)
-    fig.update_layout(**CHART_LAYOUT)
-    return fig
 
+# ======================================================
+# ---------------- Figure Templates -------------------
+# ======================================================
+# Every chart type is built (and validated by Plotly) once, then kept as a
+# plain figure dict. Each chart call copies its template and only inserts
+# the data arrays, so no Plotly Express / graph_objects work happens per call.
 
-def avg_order_chart(avg_order_daily):
-    fig = px.line(
-        avg_order_daily,
-        x="order_date",
-        y="total_amount",
-        title="Average Order Value Over Time",
-        markers=True,
-        labels={"order_date": "Date", "total_amount": "Sales (SAR)"},
-    )
-    fig.update_traces(line_color=CHART_LINE_COLOR, marker_color=CHART_MARKER_COLOR)
-    fig.update_layout(**CHART_LAYOUT)
+
+def figure_template(build):
+    """Memoize a figure builder per arguments and hand out fresh dict copies."""
+    templates = {}
+
+    @functools.wraps(build)
+    def copy_template(*args):
+        if args not in templates:
+            templates[args] = build(*args).to_plotly_json()
+        return copy.deepcopy(templates[args])
+
+    return copy_template
+
+
+# plotly.js typed array dtypes (it has no 64-bit integers)
+TYPED_ARRAY_DTYPES = {"i1", "u1", "i2", "u2", "i4", "u4", "f4", "f8"}
+
+
+def typed_array(values):
+    """
+    Numeric values as a plotly.js typed array ({"dtype", "bdata"}: base64 of
+    the raw little-endian numbers, plus "shape" for 2-D) instead of a JSON
+    list; datetimes become epoch milliseconds, for date axes. 64-bit integers
+    are narrowed to 32 bits when they fit, else sent as floats. Other and
+    empty values are returned unchanged.
+    """
+    values = np.asarray(values)
+    if np.issubdtype(values.dtype, np.datetime64):
+        values = values.astype("datetime64[ms]").astype(np.int64).astype(np.float64)
+    if values.dtype.kind not in "iuf" or values.size == 0:
+        return values
+    if values.dtype.itemsize == 8 and values.dtype.kind in "iu":
+        narrow = np.int32 if values.dtype.kind == "i" else np.uint32
+        bounds = np.iinfo(narrow)
+        fits = values.min() >= bounds.min and values.max() <= bounds.max
+        values = values.astype(narrow if fits else np.float64)
+    values = values.astype(values.dtype.newbyteorder("<"))
+    dtype = values.dtype.str[1:]  # "<f8" -> "f8"
+    if dtype not in TYPED_ARRAY_DTYPES:  # e.g. float16
+        values, dtype = values.astype("<f8"), "f8"
+    spec = {
+        "dtype": dtype,
+        "bdata": base64.b64encode(values.tobytes()).decode("ascii"),
+    }
+    if values.ndim > 1:
+        spec["shape"] = ", ".join(str(size) for size in values.shape)
+    return spec
+
+
+@figure_template
+def empty_chart(title):
+    fig = go.Figure()
+    fig.update_layout(title=title)
     return fig
 
 
-def rating_distribution_chart(df):
-    fig = px.histogram(
-        df,
-        x="customer_rating",
-        nbins=5,
-        title="Customer Rating",
-        color="customer_rating",
+@figure_template
+def _line_template(title):
+    fig = go.Figure(
+        go.Scatter(
+            x=[],
+            y=[],
+            mode="lines+markers",
+            hovertemplate="Date=%{x}<br>Sales (SAR)=%{y}<extra></extra>",
+            xhoverformat="%Y-%m-%d",
+            line=dict(color=CHART_LINE_COLOR, dash="solid"),
+            marker=dict(symbol="circle", color=CHART_MARKER_COLOR),
+            showlegend=False,
+        )
+    )
+    fig.update_layout(
+        title=title,
+        # x is sent as epoch milliseconds (see typed_array)
+        xaxis=dict(title="Date", type="date"),
+        yaxis=dict(title="Sales (SAR)"),
+        legend=dict(tracegroupgap=0),
+        uirevision="zoom",  # keep the user's zoom when detail is patched in
+        **CHART_LAYOUT,
     )
-    fig.update_layout(**CHART_LAYOUT)
     return fig
 
 
-def category_performance_chart(sales_by_category):
-    fig = px.pie(
-        sales_by_category,
-        names="category",
-        values="total_amount",
-        title="Product Category Performance",
+@figure_template
+def _anomaly_marker_template():
+    # Added as a second trace to the daily sales line (see total_sales_chart)
+    return go.Figure(
+        go.Scatter(
+            x=[],
+            y=[],
+            mode="markers",
+            name="Anomaly",
+            marker=dict(
+                symbol="circle-open",
+                size=14,
+                color=CHART_ANOMALY_COLOR,
+                line=dict(width=2),
+            ),
+            hovertemplate="%{text}<extra>Anomaly</extra>",
+            showlegend=False,
+        )
+    )
+
+
+@figure_template
+def _rating_bar_template():
+    # One pre-binned bar per rating; traces take their color from the colorway
+    fig = go.Figure(
+        go.Bar(
+            x=[],
+            y=[],
+            hovertemplate="customer_rating=%{x}<br>count=%{y}<extra></extra>",
+        )
+    )
+    fig.update_layout(
+        title="Customer Rating",
+        xaxis=dict(title="customer_rating", type="category"),
+        yaxis=dict(title="count"),
+        legend=dict(title="customer_rating", tracegroupgap=0),
+        barmode="relative",
+        **CHART_LAYOUT,
     )
-    fig.update_layout(**CHART_LAYOUT)
     return fig
 
 
-def category_sales_per_month_chart(sales_by_category_quarter):
-    if sales_by_category_quarter.empty:
-        return px.bar(title="No data available")
+@figure_template
+def _pie_template(title, hole=None):
+    fig = go.Figure(go.Pie(labels=[], values=[], hole=hole))
+    fig.update_layout(title=title, legend=dict(tracegroupgap=0), **CHART_LAYOUT)
+    return fig
 
-    fig = px.bar(
-        sales_by_category_quarter,
-        x="period",
-        y="total_amount",
-        color="category",
-        barmode="stack",
-        text_auto=True,
-        labels={"period": "Date", "total_amount": "Sales (SAR)"},
-        title="Quarterly Sales by Category",
-        color_discrete_map={
-            "Electronics": "#5879FF",
-            "Clothing": "#A66DD4",
-            "Home Goods": "#D9B5C1",
-            "Other": "#C2CFF3",
-        },
-    )
+
+@figure_template
+def _quarterly_bar_template():
+    # One stacked bar trace per category (see category_sales_per_month_chart)
+    fig = go.Figure(go.Bar(x=[], y=[], texttemplate="%{y}", textposition="auto"))
     fig.update_layout(
+        title="Quarterly Sales by Category",
         xaxis=dict(title=""),
-        yaxis=dict(range=[0, sales_by_category_quarter["total_amount"].max() * 1.25]),
+        yaxis=dict(title="Sales (SAR)", range=[0, 1]),
+        barmode="stack",
         bargap=0,
         legend=dict(
+            title="category",
+            tracegroupgap=0,
             orientation="h",
             yanchor="bottom",
             y=1.02,
@@ -89,59 +179,417 @@ def category_sales_per_month_chart(sales_by_category_quarter):
     return fig
 
 
-def rating_pie_chart(df):
-    if "customer_rating" not in df.columns or df.empty:
-        return px.pie(title="No rating data available")
+def _grouped_traces(fig, groups, color_map=None):
+    """Replace the template's single trace with one copy per (name, fields) group."""
+    prototype = fig["data"][0]
+    traces = []
+    for name, fields in groups:
+        trace = copy.deepcopy(prototype)
+        trace.update(name=str(name), legendgroup=str(name), **fields)
+        if color_map and name in color_map:
+            trace.setdefault("marker", {})["color"] = color_map[name]
+        traces.append(trace)
+    fig["data"] = traces
+    return fig
+
+
+# ======================================================
+# ------------------ Home Page Charts -----------------
+# ======================================================
+
+
+def time_series_points(series, x_range=None):
+    """
+    Points to draw for a daily series: (x, y, trace_type).
+
+    Limited to x_range (plus one neighbour on each side so the line reaches the
+    axis edges), downsampled with LTTB to CHART_POINT_BUDGET, and switched to
+    WebGL when still longer than WEBGL_THRESHOLD. A series without rows (a
+    selection with no orders) gives no points.
+    """
+    if series.empty or "order_date" not in series.columns:
+        return pd.DatetimeIndex([]), np.empty(0), "scatter"
+    x = series["order_date"].to_numpy()
+    y = series["total_amount"].to_numpy()
+
+    if x_range:
+        start = np.searchsorted(x, np.datetime64(pd.Timestamp(x_range[0])), "left")
+        end = np.searchsorted(x, np.datetime64(pd.Timestamp(x_range[1])), "right")
+        x = x[max(start - 1, 0) : end + 1]
+        y = y[max(start - 1, 0) : end + 1]
+
+    x, y = downsample(x, y, config.CHART_POINT_BUDGET)
+    trace_type = "scattergl" if len(x) > config.WEBGL_THRESHOLD else "scatter"
+    return pd.DatetimeIndex(x), y, trace_type
+
+
+def _time_series_chart(title, series):
+    fig = _line_template(title)
+    x, y, trace_type = time_series_points(series)
+    fig["data"][0].update(x=typed_array(x), y=typed_array(y), type=trace_type)
+    return fig
+
+
+def total_sales_chart(sales_over_time, anomalies=None):
+    fig = _time_series_chart("Total Sales Over Time", sales_over_time)
+    if anomalies is None or anomalies.empty or sales_over_time.empty:
+        return fig
 
-    rating_counts = df["customer_rating"].value_counts().reset_index()
-    rating_counts.columns = ["rating", "count"]
+    # --- One marker per anomalous day, on the total sales line ---
+    # anomalies: rows of anomalies.AnomalyDetector.anomalies
+    descriptions = anomalies.assign(
+        text=[
+            "{}: {} {:,.0f} (expected {:,.0f}, z {:+.1f})".format(
+                "All" if dimension == "total" else member,
+                SERIES_METRICS[metric],
+                value,
+                expected,
+                z,
+            )
+            for dimension, member, metric, value, expected, z in anomalies[
+                ["dimension", "member", "metric", "value", "expected", "z"]
+            ].itertuples(index=False)
+        ]
+    )
+    days = descriptions.groupby("order_date")["text"].agg("<br>".join)
+    sales = sales_over_time.set_index("order_date")["total_amount"]
+    days = days[days.index.isin(sales.index)]
 
-    fig = px.pie(
-        rating_counts,
-        names="rating",
-        values="count",
-        title="Customer Ratings",
-        hole=0.3,
-        color="rating",
-        color_discrete_map={
-            1: "#5879FF",
-            2: "#C2CFF3",
-            3: "#5246AB",
-            4: "#D9B5C1",
-            5: "#A66DD4",
+    markers = _anomaly_marker_template()["data"][0]
+    markers.update(
+        x=typed_array(days.index.to_numpy()),
+        y=typed_array(sales.loc[days.index].to_numpy()),
+        text=days.tolist(),
+    )
+    fig["data"].append(markers)
+    return fig
+
+
+def avg_order_chart(avg_order_daily):
+    return _time_series_chart("Average Order Value Over Time", avg_order_daily)
+
+
+def rating_distribution_chart(rating_counts):
+    # rating_counts: one row per rating (see kpi_calculations.count_ratings)
+    return _grouped_traces(
+        _rating_bar_template(),
+        [
+            (rating, {"x": [rating], "y": [count]})
+            for rating, count in zip(rating_counts["rating"], rating_counts["count"])
+        ],
+    )
+
+
+def category_performance_chart(sales_by_category):
+    fig = _pie_template("Product Category Performance")
+    fig["data"][0].update(
+        labels=sales_by_category["category"],
+        values=sales_by_category["total_amount"],
+        hovertemplate="category=%{label}<br>total_amount=%{value}<extra></extra>",
+    )
+    return fig
+
+
+def category_sales_per_month_chart(
+    sales_by_category_quarter, title="Quarterly Sales by Category"
+):
+    # sales_by_category_quarter: rows of a time rollup (see rollups.rollup_rows)
+    if sales_by_category_quarter.empty:
+        return empty_chart("No data available")
+
+    fig = _quarterly_bar_template()
+    fig["layout"]["title"]["text"] = title
+    groups = [
+        (
+            category,
+            {
+                "x": rows["label"],
+                "y": typed_array(rows["total_amount"]),
+                # period start, read by the drill-down callback on click
+                "customdata": rows["period"].dt.strftime("%Y-%m-%d"),
+                "hovertemplate": f"category={category}<br>Date=%{{x}}"
+                "<br>Sales (SAR)=%{y}<extra></extra>",
+            },
+        )
+        for category, rows in sales_by_category_quarter.groupby(
+            "category", sort=False
+        )
+    ]
+    fig["layout"]["yaxis"]["range"] = [
+        0,
+        sales_by_category_quarter["total_amount"].max() * 1.25,
+    ]
+    return _grouped_traces(
+        fig,
+        groups,
+        color_map={
+            "Electronics": "#5879FF",
+            "Clothing": "#A66DD4",
+            "Home Goods": "#D9B5C1",
+            "Other": "#C2CFF3",
         },
     )
-    fig.update_layout(**CHART_LAYOUT)
-    fig.update_traces(textinfo="percent+label")
+
+
+def category_rollup_chart(rollups, view):
+    """
+    Category sales for one drill-down view: {"grain"} for every period of
+    that grain, plus "parent", "start" and "end" within a clicked period.
+    """
+    grain = view["grain"]
+    title = f"{GRAIN_TITLES[grain]} Sales by Category"
+    if view.get("start"):
+        title += " · " + period_label(view["parent"], view["start"])
+    return category_sales_per_month_chart(
+        rollup_rows(rollups, grain, view.get("start"), view.get("end")), title
+    )
+
+
+def rating_pie_chart(rating_counts):
+    if rating_counts.empty or rating_counts["count"].sum() == 0:
+        return empty_chart("No rating data available")
+
+    color_map = {
+        1: "#5879FF",
+        2: "#C2CFF3",
+        3: "#5246AB",
+        4: "#D9B5C1",
+        5: "#A66DD4",
+    }
+
+    fig = _pie_template("Customer Ratings", 0.3)
+    fig["data"][0].update(
+        labels=rating_counts["rating"],
+        values=rating_counts["count"],
+        hovertemplate="rating=%{label}<br>count=%{value}<extra></extra>",
+        marker={"colors": [color_map.get(r) for r in rating_counts["rating"]]},
+        textinfo="percent+label",
+    )
     return fig
 
 
 # Pie chart of sales percentage by category
-def category_sales_pie_chart(df):
-    if {"category", "total_amount"}.issubset(df.columns) and not df.empty:
-        sales_by_category = df.groupby("category", as_index=False)["total_amount"].sum()
-        fig = px.pie(
-            sales_by_category,
-            names="category",
-            values="total_amount",
-            title="Sales by Category",
-            # hole=0.3,
-            color="category",
-            color_discrete_map={
-                "Electronics": "#5879FF",
-                "Clothing": "#D9B5C1",
-                "Home Goods": "#C2CFF3",
-                "Other": "#A66DD4",
+def category_sales_pie_chart(sales_by_category):
+    if not sales_by_category.empty:
+        color_map = {
+            "Electronics": "#5879FF",
+            "Clothing": "#D9B5C1",
+            "Home Goods": "#C2CFF3",
+            "Other": "#A66DD4",
+        }
+
+        fig = _pie_template("Sales by Category")
+        fig["data"][0].update(
+            labels=sales_by_category["category"],
+            values=sales_by_category["total_amount"],
+            hovertemplate="category=%{label}<br>total_amount=%{value}<extra></extra>",
+            marker={
+                "colors": [color_map.get(c) for c in sales_by_category["category"]]
             },
+            textinfo="percent+label",
         )
         # ------ Merge layout ---------------------
-
-        fig.update_traces(textinfo="percent+label")
-        layout_updates = dict(CHART_LAYOUT)
-        layout_updates.update(
+        fig["layout"].update(
             margin=dict(l=10, r=10, t=40, b=10), paper_bgcolor="white"
         )
-        fig.update_layout(**layout_updates)
         return fig
     else:
-        return px.pie(title="No category sales data available")
+        return empty_chart("No category sales data available")
+
+
+# ======================================================
+# ---------------- Customers Page Charts --------------
+# ======================================================
+
+
+@figure_template
+def _heatmap_template(title):
+    fig = go.Figure(
+        go.Heatmap(
+            z=[],
+            x=[],
+            y=[],
+            colorscale=[[0, "#F4F6FD"], [0.5, "#A66DD4"], [1, "#5246AB"]],
+            texttemplate="%{z:.0f}%",
+            hovertemplate="Cohort=%{y}<br>Month %{x}<br>Retention=%{z:.1f}%"
+            "<extra></extra>",
+            colorbar=dict(title="%", ticksuffix="%"),
+            zmin=0,
+            zmax=100,
+        )
+    )
+    fig.update_layout(
+        title=title,
+        xaxis=dict(title="Months since first order", type="category"),
+        yaxis=dict(title="First order month", type="category", autorange="reversed"),
+        **CHART_LAYOUT,
+    )
+    return fig
+
+
+def cohort_retention_chart(retention):
+    # retention: cohorts x months since first order, in % (customers.cohort_retention)
+    if retention.empty:
+        return empty_chart("No customer data available")
+
+    fig = _heatmap_template("Cohort Retention by First Order Month")
+    fig["data"][0].update(
+        z=typed_array(retention.to_numpy()),
+        x=[str(months) for months in retention.columns],
+        y=retention.index.strftime("%b %Y"),
+    )
+    return fig
+
+
+@figure_template
+def _segment_bar_template():
+    fig = go.Figure(
+        go.Bar(
+            x=[],
+            y=[],
+            orientation="h",
+            texttemplate="%{x}",
+            textposition="outside",
+            marker=dict(color="#5879FF", cornerradius="15%"),
+        )
+    )
+    fig.update_layout(
+        title="Customers by RFM Segment",
+        xaxis=dict(title="Customers"),
+        yaxis=dict(title="", autorange="reversed"),
+        **CHART_LAYOUT,
+    )
+    return fig
+
+
+def rfm_segments_chart(segments):
+    # segments: one row per RFM segment, best first (customers.segment_summary)
+    if segments.empty:
+        return empty_chart("No customer data available")
+
+    fig = _segment_bar_template()
+    fig["data"][0].update(
+        x=typed_array(segments["customers"]),
+        y=segments["segment"],
+        customdata=segments[["sales", "avg_recency", "avg_frequency"]].to_numpy(),
+        hovertemplate="%{y}<br>Customers=%{x}<br>Sales (SAR)=%{customdata[0]:,.2f}"
+        "<br>Avg days since last order=%{customdata[1]:.0f}"
+        "<br>Avg orders=%{customdata[2]:.1f}<extra></extra>",
+    )
+    return fig
+
+
+# ======================================================
+# ----------- Filter Page Figure Skeletons ------------
+# ======================================================
+# Built once and placed in the layout. The filter callback only patches
+# the data arrays (dash.Patch), so styling never travels over the wire again.
+
+
+@figure_template
+def sales_growth_chart():
+    fig = go.Figure()
+
+    # Bar for Total Sales
+    fig.add_trace(
+        go.Bar(
+            x=[],
+            y=[],
+            name="Total Sales",
+            marker_color="#5879FF",
+            hovertemplate="Sales: %{y:,.2f}<extra></extra>",
+            marker=dict(cornerradius="15%"),
+        )
+    )
+
+    # Line for MoM change
+    fig.add_trace(
+        go.Scatter(
+            x=[],
+            y=[],
+            mode="lines+markers",
+            name="Month over Month Change",
+            yaxis="y2",
+            hovertemplate="%{y:.2f}%<extra></extra>",
+            line_shape="spline",
+            line=dict(color="#D9B5C1"),
+        )
+    )
+    # Line for YoY change
+    fig.add_trace(
+        go.Scatter(
+            x=[],
+            y=[],
+            mode="lines+markers",
+            name="Year over Year Change",
+            yaxis="y2",
+            hovertemplate="%{y:.2f}%<extra></extra>",
+            line_shape="spline",
+            line=dict(color="#A66DD4"),
+        )
+    )
+
+    # --- Layout with dual y-axis
+    line_layout = dict(CHART_LAYOUT)
+    line_layout.update(
+        title="Sales Growth",
+        xaxis_title="",
+        xaxis=dict(title=""),
+        yaxis=dict(title=""),
+        yaxis2=dict(
+            title="",
+            overlaying="y",
+            side="right",
+            showgrid=False,
+        ),
+        legend=dict(
+            orientation="h",
+            yanchor="bottom",
+            y=1.05,
+            xanchor="center",
+            x=0.5,
+        ),
+        barmode="group",
+    )
+    fig.update_layout(**line_layout)
+    return fig
+
+
+@figure_template
+def top_products_chart():
+    fig = go.Figure(
+        go.Bar(
+            x=[],
+            y=[],
+            orientation="h",  # horizontal bars
+            hovertemplate="total_amount=%{x:,.2f}<br>product_name=%{y}<extra></extra>",
+            texttemplate="%{text:,}",
+            textposition="outside",
+            marker=dict(
+                color=[
+                    "#5246AB",
+                    "#5879FF",
+                    "#A66DD4",
+                    "#C2CFF3",
+                    "#D9B5C1",
+                    "#5246AB",
+                    "#5879FF",
+                    "#A66DD4",
+                    "#C2CFF3",
+                    "#D9B5C1",
+                ],
+                cornerradius="15%",
+            ),
+        )
+    )
+
+    # Highest on top
+    fig.update_yaxes(categoryorder="total ascending")
+    fig.update_layout(**CHART_LAYOUT)
+    fig.update_layout(
+        title="Top 10 Products by Sales",
+        xaxis=dict(range=[0, 1]),
+        yaxis=dict(title=""),
+        xaxis_title="",
+    )
+    return fig
@@ -0,0 +1,122 @@
+# modules/comparisons.py
+# ======================================================
+# ---------------- Period Comparisons -----------------
+# ======================================================
+# Period-over-period and year-over-year changes computed on a dense calendar:
+# aggregates are placed in an array with one slot per period (and per
+# dimension, e.g. category), months without orders count as 0, and the
+# previous period / same period last year are read by position. Comparing
+# neighbouring rows instead silently compares the wrong months as soon as a
+# month has no sales.
+
+import numpy as np
+import pandas as pd
+
+from modules.rollups import PERIOD_FREQUENCIES
+
+
+def _percent_change(current, base):
+    """(current - base) / base in percent; NaN where base is 0 or unknown."""
+    change = np.full(current.shape, np.nan)
+    np.divide(
+        (current - base) * 100, base, out=change, where=np.isfinite(base) & (base != 0)
+    )
+    return change
+
+
+def compare_periods(frame, grain, values=("total_amount",), keys=()):
+    """
+    Previous-period and same-period-last-year comparisons of a rollup-shaped
+    frame: (period, *keys, *values), period being the first day of a period
+    of `grain` (see rollups.py).
+
+    Returns one row per key combination and every period from the first to the
+    last one in the frame, with for each value column v:
+      v                    (0 for periods without rows)
+      v_previous, v_change previous period and change in percent (MoM for months)
+      v_last_year, v_yoy   same period last year and change in percent
+    Comparisons that fall before the first period are NaN.
+    """
+    keys, values = list(keys), list(values)
+    columns = ["period", *keys, *values]
+    suffixes = ["_previous", "_change", "_last_year", "_yoy"]
+    if frame.empty:
+        return pd.DataFrame(columns=columns + [v + s for v in values for s in suffixes])
+
+    # --- Place every row in its (key, period) slot ---
+    freq = PERIOD_FREQUENCIES[grain]
+    ordinals = pd.PeriodIndex(frame["period"], freq=freq).asi8
+    first = ordinals.min()
+    periods = pd.PeriodIndex.from_ordinals(
+        np.arange(first, ordinals.max() + 1), freq=freq
+    )
+    if keys:
+        grouped = frame.groupby(keys, sort=True, dropna=False)
+        codes = grouped.ngroup().to_numpy()
+        key_values = grouped.size().index.to_frame(index=False)
+    else:
+        codes = np.zeros(len(frame), dtype=np.intp)
+    dense = np.zeros((codes.max() + 1, len(periods), len(values)))
+    np.add.at(
+        dense, (codes, ordinals - first), frame[values].to_numpy(dtype=np.float64)
+    )
+
+    # --- Previous period: one slot back ---
+    previous = np.full(dense.shape, np.nan)
+    previous[:, 1:] = dense[:, :-1]
+
+    # --- Same period last year: the period containing the date a year earlier ---
+    year_ago = (periods.start_time - pd.DateOffset(years=1)).to_period(freq).asi8
+    year_ago -= first
+    last_year = np.full(dense.shape, np.nan)
+    known = year_ago >= 0
+    last_year[:, known] = dense[:, year_ago[known]]
+
+    # --- Long frame: one row per (key, period) ---
+    n_keys, n_periods = dense.shape[:2]
+    result = {"period": np.tile(periods.start_time, n_keys)}
+    for key in keys:
+        result[key] = np.repeat(key_values[key].to_numpy(), n_periods)
+    for i, value in enumerate(values):
+        current = dense[:, :, i]
+        result[value] = current.ravel()
+        result[value + "_previous"] = previous[:, :, i].ravel()
+        result[value + "_change"] = _percent_change(current, previous[:, :, i]).ravel()
+        result[value + "_last_year"] = last_year[:, :, i].ravel()
+        result[value + "_yoy"] = _percent_change(current, last_year[:, :, i]).ravel()
+    return pd.DataFrame(result)
+
+
+def month_starts(monthly):
+    """A (year, month, ...) frame with the month's first day as "period"."""
+    return monthly.assign(
+        period=pd.to_datetime(monthly[["year", "month"]].assign(day=1))
+    )
+
+
+def last_twelve_months(compared):
+    """(start, end) of the twelve months up to the last period of the calendar."""
+    last = compared["period"].max()
+    return (pd.Period(last, "M") - 11).start_time, last
+
+
+def period_window(compared, grain, start_date=None, end_date=None):
+    """Rows of compare_periods() whose period overlaps [start_date, end_date]."""
+    if compared.empty or not (start_date and end_date):
+        return compared
+    freq = PERIOD_FREQUENCIES[grain]
+    first = pd.Period(pd.to_datetime(start_date), freq).start_time
+    last = pd.Period(pd.to_datetime(end_date), freq).start_time
+    return compared[compared["period"].between(first, last)]
+
+
+def window_change(window, value):
+    """
+    Total of a value over a window, its total in the same periods last year
+    and the change in percent (None when last year is not fully known).
+    """
+    total = window[value].sum()
+    last_year = window[value + "_last_year"]
+    if last_year.empty or last_year.isna().any() or last_year.sum() == 0:
+        return total, None, None
+    return total, last_year.sum(), (total - last_year.sum()) / last_year.sum() * 100
@@ -0,0 +1,106 @@
+# modules/compression.py
+# ======================================================
+# --------------- Response Compression ----------------
+# ======================================================
+# Callback, layout and page responses (and Dash's JavaScript bundles) are
+# text and shrink several times when compressed. The encoding is negotiated
+# from Accept-Encoding: brotli when the optional `brotli` package is
+# installed and accepted, otherwise gzip.
+
+import gzip
+import threading
+from collections import OrderedDict
+
+import flask
+
+from modules import config
+
+try:
+    import brotli  # optional: pip install brotli
+except ImportError:
+    brotli = None
+
+COMPRESSIBLE_TYPES = ("application/json", "application/javascript", "text/")
+
+_static_cache = OrderedDict()  # (path, etag, encoding) -> compressed bytes
+_static_lock = threading.Lock()
+STATIC_CACHE_SIZE = 64
+
+
+def negotiate():
+    """Best encoding the current request accepts: "br", "gzip" or None."""
+    if not config.COMPRESSION:
+        return None
+    accepted = flask.request.accept_encodings
+    if brotli is not None and accepted["br"]:
+        return "br"
+    if accepted["gzip"]:
+        return "gzip"
+    return None
+
+
+def compress(body, encoding, best=False):
+    """
+    Compress bytes. best=True spends more CPU for a smaller result, for
+    bodies compressed once and served many times.
+    """
+    if encoding == "br":
+        return brotli.compress(body, quality=11 if best else 4)
+    return gzip.compress(body, compresslevel=9 if best else 6, mtime=0)
+
+
+def static_cache_bytes():
+    """Size of the compressed component bundles kept by this worker."""
+    with _static_lock:
+        return sum(len(body) for body in _static_cache.values())
+
+
+def clear_static_cache():
+    with _static_lock:
+        _static_cache.clear()
+
+
+def _compressible(response):
+    return (
+        response.status_code == 200
+        and not response.direct_passthrough
+        and "Content-Encoding" not in response.headers
+        and response.mimetype.startswith(COMPRESSIBLE_TYPES)
+        and (response.content_length or 0) >= config.COMPRESS_MIN_BYTES
+    )
+
+
+def install_compression(app):
+    """Compress the server's responses for clients that accept it."""
+    if not config.COMPRESSION:
+        return
+
+    suites_prefix = app.config.requests_pathname_prefix + "_dash-component-suites/"
+
+    @app.server.after_request
+    def compress_response(response):
+        if not _compressible(response):
+            return response
+        encoding = negotiate()
+        if encoding is None:
+            return response
+
+        # Dash's component bundles never change for a given URL (and ETag):
+        # compress each one once per worker at the best level
+        if flask.request.path.startswith(suites_prefix):
+            key = (flask.request.full_path, response.get_etag()[0], encoding)
+            with _static_lock:
+                body = _static_cache.get(key)
+            if body is None:
+                body = compress(response.get_data(), encoding, best=True)
+                with _static_lock:
+                    _static_cache[key] = body
+                    while len(_static_cache) > STATIC_CACHE_SIZE:
+                        _static_cache.popitem(last=False)
+        else:
+            body = compress(response.get_data(), encoding)
+
+        response.set_data(body)
+        response.headers["Content-Encoding"] = encoding
+        response.vary.add("Accept-Encoding")
+        return response
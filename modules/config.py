@@ -0,0 +1,122 @@
+# modules/config.py
+# ======================================================
+# ------------- Runtime Configuration -----------------
+# ======================================================
+# Deployment switches, read once from environment variables so the same
+# code runs locally (defaults) and in production (exported settings).
+
+import os
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def env_flag(name, default=False):
+    value = os.environ.get(name)
+    if value is None:
+        return default
+    return value.strip().lower() in ("1", "true", "yes", "on")
+
+
+# --- Dataset ---
+# Orders CSV loaded at startup (and reloaded when it changes on disk)
+DATA_PATH = os.environ.get(
+    "SWIFTSHOP_DATA_PATH", os.path.join(PROJECT_ROOT, "data", "swiftshop_sales_data.csv")
+)
+
+# --- Production server (wsgi.py) ---
+# Gunicorn worker processes (default: one per CPU core) and threads per worker
+WORKERS = int(os.environ.get("SWIFTSHOP_WORKERS", "0")) or os.cpu_count() or 1
+THREADS = int(os.environ.get("SWIFTSHOP_THREADS", "4"))
+BIND = os.environ.get("SWIFTSHOP_BIND", "0.0.0.0:8050")
+# Seconds before a silent worker is restarted
+WORKER_TIMEOUT = int(os.environ.get("SWIFTSHOP_WORKER_TIMEOUT", "120"))
+
+# --- Order storage ---
+# "memory": cleaned orders kept as pandas partitions in every worker.
+# "sqlite": orders kept in a local SQLite file; filters and group-bys run as SQL.
+STORAGE = os.environ.get("SWIFTSHOP_STORAGE", "memory").strip().lower()
+SQLITE_PATH = os.environ.get(
+    "SWIFTSHOP_SQLITE_PATH", os.path.join(PROJECT_ROOT, ".cache", "orders.sqlite")
+)
+
+# --- Data validation ---
+# Orders failing a quality rule (see modules/validation.py) are left out and
+# written with their reasons to QUARANTINE_DIR/<store>.csv. total_amount may
+# differ from unit_price * quantity by VALIDATION_AMOUNT_TOLERANCE (rounding).
+VALIDATION = env_flag("SWIFTSHOP_VALIDATION", default=True)
+VALIDATION_AMOUNT_TOLERANCE = float(
+    os.environ.get("SWIFTSHOP_VALIDATION_AMOUNT_TOLERANCE", "0.01")
+)
+QUARANTINE_DIR = os.environ.get(
+    "SWIFTSHOP_QUARANTINE_DIR", os.path.join(PROJECT_ROOT, ".cache", "quarantine")
+)
+
+# --- Warm-start snapshot ---
+# Prepared data and serialized pages are restored from this file on boot
+# when the data file and preparation code are unchanged.
+SNAPSHOT = env_flag("SWIFTSHOP_SNAPSHOT", default=True)
+SNAPSHOT_PATH = os.environ.get(
+    "SWIFTSHOP_SNAPSHOT_PATH", os.path.join(PROJECT_ROOT, ".cache", "snapshot.pkl")
+)
+
+# --- Background callbacks (heavy filter queries) ---
+# Run the orders table and export callbacks in worker processes managed by a
+# local diskcache. Requires: pip install "dash[diskcache]"
+BACKGROUND_CALLBACKS = env_flag("SWIFTSHOP_BACKGROUND_CALLBACKS")
+BACKGROUND_CACHE_DIR = os.environ.get(
+    "SWIFTSHOP_BACKGROUND_CACHE_DIR",
+    os.path.join(PROJECT_ROOT, ".cache", "background"),
+)
+
+# --- Long daily time series ---
+# Maximum points drawn per line chart (LTTB downsampling, 0 = no limit)
+CHART_POINT_BUDGET = int(os.environ.get("SWIFTSHOP_CHART_POINT_BUDGET", "1500"))
+# Lines with more points than this are drawn with WebGL (Scattergl)
+WEBGL_THRESHOLD = int(os.environ.get("SWIFTSHOP_WEBGL_THRESHOLD", "1000"))
+
+# --- Response compression ---
+# gzip / brotli (if the optional `brotli` package is installed) for clients
+# that accept it; responses smaller than COMPRESS_MIN_BYTES are sent as-is.
+COMPRESSION = env_flag("SWIFTSHOP_COMPRESSION", default=True)
+COMPRESS_MIN_BYTES = int(os.environ.get("SWIFTSHOP_COMPRESS_MIN_BYTES", "1024"))
+
+# --- Metrics ---
+# Callback / data preparation timings in the Prometheus text format. Off by
+# default: the endpoint has no auth and is served on the app's own port
+METRICS = env_flag("SWIFTSHOP_METRICS")
+METRICS_PATH = os.environ.get("SWIFTSHOP_METRICS_PATH", "/metrics")
+
+# --- Product search ---
+# Most products offered by one search of the product filter
+PRODUCT_SEARCH_LIMIT = int(os.environ.get("SWIFTSHOP_PRODUCT_SEARCH_LIMIT", "50"))
+
+# --- Memory accounting ---
+# Report of the dataset's and caches' memory on MEMORY_PATH ("" = off, the
+# default: it has no auth, so only set it for development, e.g. /debug/memory).
+# With MEMORY_BUDGET_MB > 0, columns are dropped / downcast / categorized and
+# caches evicted after every load until the accounted memory fits (0 = off).
+MEMORY_PATH = os.environ.get("SWIFTSHOP_MEMORY_PATH", "")
+MEMORY_BUDGET_MB = float(os.environ.get("SWIFTSHOP_MEMORY_BUDGET_MB", "0"))
+
+# --- Stage profiling (opt-in, slows requests down) ---
+# Write a Chrome trace (chrome://tracing, Perfetto, speedscope) per callback
+# request, with timings and traced allocations of each pipeline stage.
+PROFILE = env_flag("SWIFTSHOP_PROFILE")
+PROFILE_DIR = os.environ.get(
+    "SWIFTSHOP_PROFILE_DIR", os.path.join(PROJECT_ROOT, ".cache", "profiles")
+)
+# Only keep traces of requests slower than this many milliseconds
+PROFILE_MIN_MS = float(os.environ.get("SWIFTSHOP_PROFILE_MIN_MS", "0"))
+
+# --- Anomaly detection on daily sales and order counts ---
+# Flag days more than ANOMALY_Z standard deviations from the EWMA (half-life
+# in days), after ANOMALY_WARMUP days of history; ANOMALY_SEASON = 7 compares
+# each day with the same weekday (1 = no seasonality)
+ANOMALY_Z = float(os.environ.get("SWIFTSHOP_ANOMALY_Z", "3"))
+ANOMALY_HALFLIFE_DAYS = float(os.environ.get("SWIFTSHOP_ANOMALY_HALFLIFE_DAYS", "14"))
+ANOMALY_WARMUP = int(os.environ.get("SWIFTSHOP_ANOMALY_WARMUP", "10"))
+ANOMALY_SEASON = max(int(os.environ.get("SWIFTSHOP_ANOMALY_SEASON", "7")), 1)
+
+# --- Live KPI cards ---
+# Seconds between KPI card refresh checks (0 = no auto-refresh)
+KPI_REFRESH_SECONDS = float(os.environ.get("SWIFTSHOP_KPI_REFRESH_SECONDS", "0"))
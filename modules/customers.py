@@ -0,0 +1,227 @@
+# modules/customers.py
+# ======================================================
+# ---------------- Customer Analytics -----------------
+# ======================================================
+# Cohort retention (customers grouped by the month of their first order) and
+# RFM segments (recency, frequency, monetary value).
+#
+# Customers are coded as integers and the orders sorted once by customer and
+# date, so each customer's orders form one contiguous run. Per-customer values
+# are NumPy reductions over those runs (np.*.reduceat) instead of a pandas
+# groupby or a loop per customer. Results are computed once per dataset
+# version (CustomerAnalytics).
+
+import threading
+
+import numpy as np
+import pandas as pd
+
+from modules.metrics import timed
+
+CUSTOMER_COLUMNS = ["customer_id", "order_date", "total_amount"]
+
+# --- RFM segment per (recency score, frequency score), scores 1-5 ---
+# Rows: recency score 1 (longest since the last order) to 5; columns:
+# frequency score 1 (fewest orders) to 5.
+SEGMENT_GRID = np.array(
+    [
+        ["Hibernating", "Hibernating", "At Risk", "At Risk", "Can't Lose Them"],
+        ["Hibernating", "Hibernating", "At Risk", "At Risk", "At Risk"],
+        ["About to Sleep", "About to Sleep", "Need Attention", "Loyal", "Loyal"],
+        ["Promising", "Potential Loyalist", "Potential Loyalist", "Loyal", "Loyal"],
+        ["New", "Potential Loyalist", "Potential Loyalist", "Champions", "Champions"],
+    ]
+)
+SEGMENTS = [  # best first
+    "Champions",
+    "Loyal",
+    "Potential Loyalist",
+    "New",
+    "Promising",
+    "Need Attention",
+    "About to Sleep",
+    "Can't Lose Them",
+    "At Risk",
+    "Hibernating",
+]
+
+
+# ======================================================
+# ---------------- Encoding ---------------------------
+# ======================================================
+def encode_orders(orders):
+    """
+    Integer-coded orders sorted by customer, then date.
+
+    Returns (codes, days, amounts, customers): the customer code of every
+    order (0..n-1, in order of first appearance), its date as a day number,
+    its amount, and the customer_id of each code. Orders without a customer
+    or a date are left out.
+    """
+    orders = orders.dropna(subset=["customer_id", "order_date"])
+    codes, customers = pd.factorize(orders["customer_id"])
+    days = orders["order_date"].to_numpy(dtype="datetime64[D]").astype(np.int64)
+    amounts = orders["total_amount"].to_numpy(dtype=np.float64)
+
+    order = np.lexsort((days, codes))
+    return codes[order], days[order], amounts[order], customers
+
+
+def _run_starts(codes):
+    """Index of the first order of every customer in sorted codes."""
+    return np.flatnonzero(np.r_[True, codes[1:] != codes[:-1]])
+
+
+def _month_numbers(days):
+    return days.astype("datetime64[D]").astype("datetime64[M]").astype(np.int64)
+
+
+# ======================================================
+# ---------------- Cohort Retention -------------------
+# ======================================================
+@timed("cohort_retention")
+def cohort_retention(codes, days):
+    """
+    Share of each first-order-month cohort ordering again N months later.
+
+    Returns (retention, sizes): retention in percent with one row per cohort
+    month and one column per month since the first order (NaN for months
+    after the end of the data), and the number of customers per cohort.
+    """
+    if len(codes) == 0:
+        return pd.DataFrame(), pd.Series(dtype=int)
+
+    months = _month_numbers(days)
+    first_month = np.minimum.reduceat(months, _run_starts(codes))  # per code
+    cohort = first_month[codes]
+    age = months - cohort
+
+    # Count each customer once per month they ordered in
+    active = np.r_[True, (codes[1:] != codes[:-1]) | (months[1:] != months[:-1])]
+    first_cohort, last_month = cohort.min(), months.max()
+    shape = (cohort.max() - first_cohort + 1, age.max() + 1)
+    counts = np.zeros(shape, dtype=np.int64)
+    np.add.at(counts, (cohort[active] - first_cohort, age[active]), 1)
+
+    sizes = counts[:, 0]
+    retention = np.full(counts.shape, np.nan)
+    np.divide(counts * 100, sizes[:, None], out=retention, where=sizes[:, None] > 0)
+
+    # Months a cohort has not reached yet are unknown, not 0%
+    cohort_months = np.arange(first_cohort, cohort.max() + 1)
+    observed = cohort_months[:, None] + np.arange(counts.shape[1]) <= last_month
+    retention[~observed] = np.nan
+
+    index = pd.DatetimeIndex(cohort_months.astype("datetime64[M]"), name="cohort")
+    return (
+        pd.DataFrame(retention, index=index).rename_axis("months_since", axis=1),
+        pd.Series(sizes, index=index, name="customers"),
+    )
+
+
+# ======================================================
+# ---------------- RFM Segments -----------------------
+# ======================================================
+def _scores(values):
+    """Quintile scores 1-5 (5 = highest value); equal values share a score."""
+    pct = pd.Series(values).rank(method="min", pct=True).to_numpy()
+    return np.clip(np.ceil(pct * 5), 1, 5).astype(int)
+
+
+@timed("rfm")
+def rfm_scores(codes, days, amounts, customers, as_of=None):
+    """
+    Recency (days since the last order, as of the day after the last order in
+    the data), frequency (orders), monetary value (sales), their 1-5 scores and
+    the RFM segment of every customer.
+    """
+    if len(codes) == 0:
+        return pd.DataFrame(
+            columns=["customer_id", "recency", "frequency", "monetary"]
+            + ["r_score", "f_score", "m_score", "segment"]
+        )
+
+    starts = _run_starts(codes)
+    last_order = np.maximum.reduceat(days, starts)
+    frequency = np.diff(np.r_[starts, len(codes)])
+    monetary = np.add.reduceat(np.nan_to_num(amounts), starts)
+    recency = (days.max() + 1 if as_of is None else as_of) - last_order
+
+    r_score = _scores(-recency)
+    f_score = _scores(frequency)
+    return pd.DataFrame(
+        {
+            "customer_id": customers[codes[starts]],
+            "recency": recency,
+            "frequency": frequency,
+            "monetary": monetary,
+            "r_score": r_score,
+            "f_score": f_score,
+            "m_score": _scores(monetary),
+            "segment": SEGMENT_GRID[r_score - 1, f_score - 1],
+        }
+    )
+
+
+def segment_summary(rfm):
+    """Customers, sales and average R/F/M per segment, best segments first."""
+    summary = rfm.groupby("segment").agg(
+        customers=("customer_id", "size"),
+        sales=("monetary", "sum"),
+        avg_recency=("recency", "mean"),
+        avg_frequency=("frequency", "mean"),
+        avg_monetary=("monetary", "mean"),
+    )
+    summary = summary.reindex([s for s in SEGMENTS if s in summary.index])
+    return summary.reset_index()
+
+
+# ======================================================
+# ---------------- Cached Results ---------------------
+# ======================================================
+class CustomerAnalytics:
+    """Cohort retention and RFM segments of a dataset, once per dataset version."""
+
+    def __init__(self, dataset):
+        self.dataset = dataset
+        self.hits = 0
+        self.misses = 0
+        self._version = None
+        self._results = None
+        self._lock = threading.Lock()
+
+    def get(self):
+        with self._lock:
+            if self._version == self.dataset.version:
+                self.hits += 1
+                return self._results
+            self.misses += 1
+            version = self.dataset.version
+            results = analyze_customers(self.dataset.customer_orders())
+            self._version, self._results = version, results
+            return results
+
+    @property
+    def cached(self):
+        """The results of the last get(), or None."""
+        return self._results
+
+    def clear(self):
+        """Drop the cached results; the next get() computes them again."""
+        with self._lock:
+            self._version = self._results = None
+
+
+def analyze_customers(orders):
+    """Cohort retention, cohort sizes, per-customer RFM and the segment summary."""
+    if not set(CUSTOMER_COLUMNS).issubset(orders.columns):
+        orders = pd.DataFrame(columns=CUSTOMER_COLUMNS)
+    codes, days, amounts, customers = encode_orders(orders)
+    retention, cohort_sizes = cohort_retention(codes, days)
+    rfm = rfm_scores(codes, days, amounts, customers)
+    return {
+        "retention": retention,
+        "cohort_sizes": cohort_sizes,
+        "rfm": rfm,
+        "segments": segment_summary(rfm),
+    }
@@ -1,6 +1,8 @@
 # --- Import pandas for data analysis ---
 import pandas as pd
+from modules.metrics import timed
 
+@timed("clean")
 def clean(df):
     # --- Quick checks on dataset structure ---
     #df.shape          # Shows number of rows and columns
@@ -11,8 +13,12 @@ def clean(df):
     # --- Handling Missing Values ---
     # =====================================================================
 
+    # (Skipped without rows, e.g. all quarantined: the row-wise apply would
+    #  return an empty frame instead of a column)
+    has_rows = not df.empty
+
     # --- Fill missing values in customer_rating ---
-    if 'customer_rating' in df.columns and 'product_id' in df.columns:
+    if has_rows and 'customer_rating' in df.columns and 'product_id' in df.columns:
         # Step 1: For each product_id, find the most frequent (mode) rating
         product_rating_map = df.groupby('product_id')['customer_rating'] \
             .apply(lambda x: x.dropna().mode()[0] if not x.dropna().empty else None)
@@ -28,7 +34,7 @@ def clean(df):
         df['customer_rating'] = df['customer_rating'].astype(int)
 
     # --- Fill missing values in customer_region ---
-    if 'customer_region' in df.columns and 'customer_id' in df.columns:
+    if has_rows and 'customer_region' in df.columns and 'customer_id' in df.columns:
         # Step 1: For each customer_id, find the most frequent (mode) region
         customer_region_map = df.groupby('customer_id')['customer_region'] \
             .agg(lambda x: x.mode().iloc[0] if not x.mode().empty else None)
@@ -1,10 +1,31 @@
 import os
 import pandas as pd
+from modules import config
 from modules.data_clean import clean
+from modules.metrics import timed
+from modules.validation import validate
 
 
-def load_data():
-    project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-    data_path = os.path.join(project_root, "data", "swiftshop_sales_data.csv")
+def data_sources(data_path=None):
+    """
+    Store name -> CSV path. data_path is one orders CSV (a single store) or a
+    directory with one CSV per store, named after the store.
+    """
+    data_path = data_path or config.DATA_PATH
+    if os.path.isdir(data_path):
+        return {
+            os.path.splitext(name)[0]: os.path.join(data_path, name)
+            for name in sorted(os.listdir(data_path))
+            if name.lower().endswith(".csv")
+        }
+    return {os.path.splitext(os.path.basename(data_path))[0]: data_path}
+
+
+@timed("load_data")
+def load_data(data_path=None):
+    data_path = data_path or config.DATA_PATH
     df = pd.read_csv(data_path)
+    if config.VALIDATION:
+        # Bad rows are quarantined instead of skewing the KPIs
+        df = validate(df, store=os.path.splitext(os.path.basename(data_path))[0])
     return clean(df)
@@ -0,0 +1,367 @@
+# modules/dataset.py
+# ======================================================
+# ------------------- Dataset -------------------------
+# ======================================================
+# The cleaned orders and everything derived from them (KPI tables, the KPI
+# cube). Callbacks read the current data from here, so a reload swaps it
+# for every callback at once and bumps the dataset version.
+#
+# Orders are split into partitions per (store, year). Each partition keeps
+# its own partial KPI aggregates and KPI cube; dashboard-wide values are
+# merged from those, and filtered queries only touch the partitions their
+# store and date filters can match. A reload re-reads only changed stores.
+#
+# This is the in-memory backend. modules/sqlite_store.py keeps the orders in
+# a SQLite file instead and answers the same queries with SQL
+# (SWIFTSHOP_STORAGE=sqlite); open_dataset() returns the configured one.
+
+import hashlib
+import logging
+import os
+import threading
+import time
+
+import pandas as pd
+
+from modules import config
+from modules.aggregates import build_kpi_cube, kpi_totals, monthly_totals
+from modules.customers import CUSTOMER_COLUMNS
+from modules.data_load import data_sources, load_data
+from modules.filters import SelectionCache, filter_orders
+from modules.kpi_calculations import finalize_kpis, merge_partial_kpis, partial_kpis
+from modules.profiling import stage
+from modules.search import PRODUCT_COLUMNS
+from modules.snapshot import load_snapshot
+
+logger = logging.getLogger(__name__)
+
+# Columns that only describe the partition / date parts, not the order itself
+PARTITION_COLUMNS = ["store", "year", "month", "month_name", "period"]
+
+
+class Partition:
+    """Orders of one store and year, with their partial KPIs and KPI cube."""
+
+    def __init__(self, store, year, df, partial=None, cube=None):
+        self.store = store
+        self.year = year  # None for orders without a valid date
+        self.df = df  # None when the orders live in an external store
+        self.partial = partial if partial is not None else partial_kpis(df)
+        self.cube = cube if cube is not None else build_kpi_cube(df)
+
+
+def partition_store(store, df):
+    """Split one store's cleaned orders into yearly partitions."""
+    df = df.assign(store=store)
+    if "year" not in df.columns:
+        return [Partition(store, None, df)]
+    return [
+        Partition(store, None if pd.isna(year) else int(year), part)
+        for year, part in df.groupby("year", dropna=False, sort=True)
+    ]
+
+
+def open_dataset(data_path=None):
+    """The dataset for the configured storage backend (SWIFTSHOP_STORAGE)."""
+    if config.STORAGE == "sqlite":
+        from modules.sqlite_store import SQLiteDataset  # subclasses Dataset
+
+        return SQLiteDataset(data_path)
+    return Dataset(data_path)
+
+
+class Dataset:
+    def __init__(self, data_path=None):
+        self.data_path = data_path or config.DATA_PATH
+        self.version = None
+        self.partitions = []
+        self.kpis = None
+        self.snapshot = None  # warm-start snapshot this data was restored from
+        self._signatures = {}
+        self._listeners = []
+        self._lock = threading.Lock()
+        self._refresher_pid = None  # process running the refresh_every() thread
+        # Filtered selections shared by the chart, top products and table queries
+        self.selections = SelectionCache(self)
+        self.load()
+
+    def source_signatures(self):
+        """Store -> (mtime, size); changes whenever a store file is rewritten."""
+        signatures = {}
+        for store, path in data_sources(self.data_path).items():
+            stat = os.stat(path)
+            signatures[store] = (stat.st_mtime_ns, stat.st_size)
+        return signatures
+
+    def load(self, stores=None):
+        """
+        (Re)load the given stores (default: all) and drop stores whose file is
+        gone. Partitions of the other stores are kept as they are.
+        """
+        signatures = self.source_signatures()
+        sources = data_sources(self.data_path)
+        snapshot = self._restore_snapshot(signatures) if stores is None else None
+        if snapshot is not None:
+            partitions = snapshot["partitions"]
+        else:
+            reload = set(signatures) if stores is None else set(stores)
+            self._forget_missing_stores(signatures)
+            partitions = [
+                partition
+                for partition in self.partitions
+                if partition.store in signatures and partition.store not in reload
+            ]
+            for store in sorted(reload & set(signatures)):
+                partitions.extend(
+                    self._load_store(store, sources[store], signatures[store])
+                )
+            partitions.sort(key=lambda p: (p.store, p.year is None, p.year or 0))
+
+        self.snapshot = snapshot
+
+        self.partitions = partitions
+        self.kpis = finalize_kpis(merge_partial_kpis([p.partial for p in partitions]))
+        self._signatures = signatures
+        self.version = hashlib.sha1(
+            repr(sorted(signatures.items())).encode()
+        ).hexdigest()[:12]
+
+        for listener in self._listeners:
+            listener(self)
+
+    def refresh(self):
+        """Reload stores changed on disk. Returns True when a new version was loaded."""
+        if self.source_signatures() == self._signatures:
+            return False
+        with self._lock:
+            signatures = self.source_signatures()
+            if signatures == self._signatures:
+                return False
+            changed = [
+                store
+                for store, signature in signatures.items()
+                if self._signatures.get(store) != signature
+            ]
+            self.load(stores=changed)
+            return True
+
+    def refresh_every(self, seconds):
+        """
+        Call refresh() every `seconds` from a daemon thread, off the request
+        threads. Started once per process: threads do not survive a fork, so
+        preforked workers start their own on their first call.
+        """
+        if not seconds or self._refresher_pid == os.getpid():
+            return
+        with self._lock:
+            if self._refresher_pid == os.getpid():
+                return
+            self._refresher_pid = os.getpid()
+        threading.Thread(
+            target=self._refresh_loop,
+            args=(seconds,),
+            name="swiftshop-refresh",
+            daemon=True,
+        ).start()
+
+    def _refresh_loop(self, seconds):
+        while True:
+            time.sleep(seconds)
+            try:
+                self.refresh()
+            except Exception:  # keep watching: the next change may load fine
+                logger.exception("Reloading %s failed", self.data_path)
+
+    def on_change(self, listener):
+        """Call listener(dataset) after every reload."""
+        self._listeners.append(listener)
+
+    # --- Storage hooks (overridden by other backends) ---
+    def _restore_snapshot(self, signatures):
+        return load_snapshot(self.data_path) if config.SNAPSHOT else None
+
+    def _forget_missing_stores(self, signatures):
+        pass  # partitions of removed stores are simply not kept
+
+    def _load_store(self, store, path, signature):
+        return partition_store(store, load_data(path))
+
+    # ======================================================
+    # ---------------- Metadata ---------------------------
+    # ======================================================
+    @property
+    def stores(self):
+        return sorted({partition.store for partition in self.partitions})
+
+    @property
+    def columns(self):
+        return self.partitions[0].df.columns if self.partitions else pd.Index([])
+
+    def date_bounds(self):
+        """(first, last) order date over all partitions."""
+        dates = [
+            bound
+            for partition in self.partitions
+            if "order_date" in partition.df.columns
+            for bound in (
+                partition.df["order_date"].min(),
+                partition.df["order_date"].max(),
+            )
+            if pd.notnull(bound)
+        ]
+        return (min(dates), max(dates)) if dates else (None, None)
+
+    def distinct(self, column):
+        """Distinct non-null values of a column, in first-seen order."""
+        values = {}
+        for partition in self.partitions:
+            if column in partition.df.columns:
+                values.update(dict.fromkeys(partition.df[column].dropna().unique()))
+        return list(values)
+
+    # ======================================================
+    # ---------------- Pruned Queries ---------------------
+    # ======================================================
+    def prune(self, start_date=None, end_date=None, selected_stores=None):
+        """Partitions whose store and year can match the filters."""
+        partitions = self.partitions
+        if selected_stores:
+            partitions = [p for p in partitions if p.store in selected_stores]
+        if start_date and end_date:
+            first, last = pd.to_datetime(start_date).year, pd.to_datetime(end_date).year
+            partitions = [
+                p for p in partitions if p.year is not None and first <= p.year <= last
+            ]
+        return partitions
+
+    def select(
+        self,
+        start_date=None,
+        end_date=None,
+        selected_regions=None,
+        selected_categories=None,
+        selected_stores=None,
+        selected_products=None,
+    ):
+        """Orders matching the dashboard filters (see filters.filter_orders)."""
+        with stage("prune"):
+            partitions = self.prune(start_date, end_date, selected_stores)
+        with stage("mask"):
+            frames = [
+                filter_orders(
+                    p.df,
+                    start_date,
+                    end_date,
+                    selected_regions,
+                    selected_categories,
+                    selected_products,
+                )
+                for p in partitions
+            ]
+        if not frames:
+            return pd.DataFrame(columns=self.columns)
+        if len(frames) == 1:
+            return frames[0]
+        with stage("concat"):
+            return pd.concat(frames, ignore_index=True)
+
+    def monthly_sales(
+        self,
+        start_date=None,
+        end_date=None,
+        selected_regions=None,
+        selected_categories=None,
+        selected_stores=None,
+        selected_products=None,
+    ):
+        """Sales and orders per (year, month) of the filtered orders, from the cubes."""
+        cube = self._pruned_cube(
+            start_date, end_date, selected_stores, selected_products
+        )
+        with stage("groupby"):
+            return monthly_totals(
+                cube, start_date, end_date, selected_regions, selected_categories
+            )
+
+    def top_products(self, limit=10, **filters):
+        """The best selling products of the filtered orders."""
+        filtered_df = self.selections.get(**filters)
+        if filtered_df.empty or "product_name" not in filtered_df.columns:
+            return pd.DataFrame(columns=["product_name", "total_amount"])
+        with stage("groupby"):
+            return (
+                filtered_df.groupby("product_name", as_index=False, observed=True)[
+                    "total_amount"
+                ]
+                .sum()
+                .sort_values(by="total_amount", ascending=False)
+                .head(limit)
+            )
+
+    def orders_page(self, page, page_size, **filters):
+        """One page of the filtered orders and the number of matching orders."""
+        filtered_df = self.selections.get(**filters)
+        start = page * page_size
+        return filtered_df.iloc[start : start + page_size], len(filtered_df)
+
+    def products(self):
+        """product_id and product_name of every product (for the search index)."""
+        frames = [
+            p.df[[c for c in PRODUCT_COLUMNS if c in p.df.columns]].drop_duplicates()
+            for p in self.partitions
+        ]
+        if not frames:
+            return pd.DataFrame(columns=PRODUCT_COLUMNS)
+        return pd.concat(frames, ignore_index=True).drop_duplicates()
+
+    def customer_orders(self):
+        """customer_id, order_date and total_amount of every order."""
+        frames = [
+            p.df[[c for c in CUSTOMER_COLUMNS if c in p.df.columns]]
+            for p in self.partitions
+        ]
+        if not frames:
+            return pd.DataFrame(columns=CUSTOMER_COLUMNS)
+        return pd.concat(frames, ignore_index=True)
+
+    def kpi_totals(
+        self,
+        start_date=None,
+        end_date=None,
+        selected_regions=None,
+        selected_categories=None,
+        selected_stores=None,
+        selected_products=None,
+    ):
+        """Filtered KPI totals from the cubes of the matching partitions."""
+        cube = self._pruned_cube(
+            start_date, end_date, selected_stores, selected_products
+        )
+        return kpi_totals(
+            cube, start_date, end_date, selected_regions, selected_categories
+        )
+
+    def _pruned_cube(
+        self,
+        start_date=None,
+        end_date=None,
+        selected_stores=None,
+        selected_products=None,
+    ):
+        """KPI cube rows of the partitions that can match the filters."""
+        if selected_products:
+            # The cubes have no product dimension: aggregate those products' orders
+            orders = self.selections.get(
+                start_date,
+                end_date,
+                selected_stores=selected_stores,
+                selected_products=selected_products,
+            )
+            with stage("cube"):
+                return build_kpi_cube(orders)
+        cubes = [p.cube for p in self.prune(start_date, end_date, selected_stores)]
+        if len(cubes) == 1:
+            return cubes[0]
+        if cubes:
+            return pd.concat(cubes, ignore_index=True)
+        return build_kpi_cube(pd.DataFrame())
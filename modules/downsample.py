@@ -0,0 +1,63 @@
+# modules/downsample.py
+# ======================================================
+# ------------- Time Series Downsampling --------------
+# ======================================================
+# Largest-Triangle-Three-Buckets (LTTB): keeps the points that preserve the
+# visual shape of a line while cutting it down to a fixed point budget.
+
+import numpy as np
+
+
+def lttb_indices(x, y, n_out):
+    """
+    Return the positions of the n_out points LTTB keeps from (x, y).
+
+    x must be sorted ascending and numeric (datetimes as int64). The first and
+    last points are always kept. If the series already fits, every index is
+    returned.
+    """
+    n = len(x)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+
+    # Bucket boundaries for the n - 2 interior points
+    edges = np.linspace(1, n - 1, n_out - 1).astype(np.int64)
+
+    selected = np.empty(n_out, dtype=np.int64)
+    selected[0] = 0
+    selected[-1] = n - 1
+
+    a = 0
+    for i in range(n_out - 2):
+        start, end = edges[i], edges[i + 1]
+
+        # Average of the next bucket (the last bucket looks at the final point)
+        next_start = end
+        next_end = edges[i + 2] if i + 2 < len(edges) else n
+        avg_x = x[next_start:next_end].mean()
+        avg_y = y[next_start:next_end].mean()
+
+        # Pick the point forming the largest triangle with a and the average
+        area = np.abs(
+            (x[a] - avg_x) * (y[start:end] - y[a])
+            - (x[a] - x[start:end]) * (avg_y - y[a])
+        )
+        a = start + int(np.argmax(area))
+        selected[i + 1] = a
+
+    return selected
+
+
+def downsample(x, y, n_out):
+    """Downsample a series to at most n_out points. Returns (x, y)."""
+    x = np.asarray(x)
+    y = np.asarray(y)
+    if not n_out or len(x) <= n_out:
+        return x, y
+
+    x_numeric = x.view("int64") if np.issubdtype(x.dtype, np.datetime64) else x
+    idx = lttb_indices(x_numeric, y, n_out)
+    return x[idx], y[idx]
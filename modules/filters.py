@@ -0,0 +1,168 @@
+# modules/filters.py
+# ======================================================
+# ---------------- Dashboard Filters ------------------
+# ======================================================
+# The date / region / category / store / product selection is computed once per
+# combination of filter values and shared by every callback that needs it,
+# so the chart, top products and table callbacks can run side by side.
+
+import threading
+from collections import OrderedDict
+
+import pandas as pd
+
+from modules.metrics import SELECTION_ROWS
+
+
+# Names of the filter values, in the order of the filter inputs
+FILTER_FIELDS = (
+    "start_date",
+    "end_date",
+    "selected_regions",
+    "selected_categories",
+    "selected_stores",
+    "selected_products",
+)
+
+
+def filter_orders(
+    df,
+    start_date,
+    end_date,
+    selected_regions,
+    selected_categories,
+    selected_products=None,
+):
+    """Return the rows of df matching the filter values (month granularity for dates)."""
+    filtered_df = df
+
+    # --- Date Filter ---
+    if start_date and end_date and "year" in df.columns and "month" in df.columns:
+        start_date = pd.to_datetime(start_date)
+        end_date = pd.to_datetime(end_date)
+        filtered_df = filtered_df[
+            (
+                (df["year"] > start_date.year)
+                | ((df["year"] == start_date.year) & (df["month"] >= start_date.month))
+            )
+            & (
+                (df["year"] < end_date.year)
+                | ((df["year"] == end_date.year) & (df["month"] <= end_date.month))
+            )
+        ]
+
+    # --- Region Filter ---
+    if selected_regions and "customer_region" in filtered_df.columns:
+        filtered_df = filtered_df[filtered_df["customer_region"].isin(selected_regions)]
+
+    # --- Category Filter ---
+    if selected_categories and "category" in filtered_df.columns:
+        filtered_df = filtered_df[filtered_df["category"].isin(selected_categories)]
+
+    # --- Product Filter (product ids) ---
+    if selected_products and "product_id" in filtered_df.columns:
+        filtered_df = filtered_df[filtered_df["product_id"].isin(selected_products)]
+
+    return filtered_df
+
+
+def selection_key(
+    start_date,
+    end_date,
+    selected_regions,
+    selected_categories,
+    selected_stores=None,
+    selected_products=None,
+):
+    """Hashable, order-insensitive key for one combination of filter values."""
+    return (
+        start_date,
+        end_date,
+        tuple(sorted(selected_regions or ())),
+        tuple(sorted(selected_categories or ())),
+        tuple(sorted(selected_stores or ())),
+        tuple(sorted(selected_products or ())),
+    )
+
+
+class SelectionCache:
+    """
+    Thread-safe LRU of filtered frames keyed by dataset version and filter values.
+    Frames come from dataset.select(), which only scans the partitions the
+    store and date filters can match.
+
+    When several callbacks ask for the same selection at once, the first one
+    computes it and the others wait for that result instead of re-filtering.
+    Cached frames are shared: callers must not modify them in place.
+    """
+
+    def __init__(self, dataset, maxsize=32):
+        self.dataset = dataset
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._pending = {}
+        self._lock = threading.Lock()
+
+    def get(
+        self,
+        start_date=None,
+        end_date=None,
+        selected_regions=None,
+        selected_categories=None,
+        selected_stores=None,
+        selected_products=None,
+    ):
+        version = self.dataset.version
+        filters = (
+            start_date,
+            end_date,
+            selected_regions,
+            selected_categories,
+            selected_stores,
+            selected_products,
+        )
+        key = (version,) + selection_key(*filters)
+
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key]
+            event = self._pending.get(key)
+            owner = event is None
+            if owner:
+                event = self._pending[key] = threading.Event()
+                self.misses += 1
+
+        if not owner:
+            event.wait()
+            with self._lock:
+                if key in self._entries:
+                    self.hits += 1
+                    return self._entries[key]
+            # The computing thread failed; compute our own copy
+            return self.dataset.select(*filters)
+
+        try:
+            filtered_df = self.dataset.select(*filters)
+            SELECTION_ROWS.observe(len(filtered_df))
+            with self._lock:
+                self._entries[key] = filtered_df
+                while len(self._entries) > self.maxsize:
+                    self._entries.popitem(last=False)
+            return filtered_df
+        finally:
+            with self._lock:
+                del self._pending[key]
+            event.set()
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def frames(self):
+        """The cached filtered frames (for memory accounting)."""
+        with self._lock:
+            return list(self._entries.values())
@@ -2,17 +2,127 @@
 # ======================================================
 # ---------------- KPI Calculations -------------------
 # ======================================================
+# KPIs are computed in two steps so they can be built per data partition:
+#   partial_kpis(df)          -> additive sums/counts for one partition
+#   merge_partial_kpis(parts) -> the same sums over several partitions
+#   finalize_kpis(partial)    -> display values and chart tables
+# calculate_kpis(df) runs all three for a single frame.
 
 import pandas as pd
 
+from modules.metrics import timed
+from modules.rollups import DEFAULT_GRAIN, build_rollups, rollup_rows
 
-def calculate_kpis(df):
+# --- Additive measures kept for every group ---
+MEASURES = ["total_amount", "amount_count", "orders", "rating_sum", "rating_count"]
+
+# --- Group keys of each partial aggregate ([] = grand total) ---
+PARTIAL_KEYS = {
+    "totals": [],
+    "by_date": ["order_date"],
+    "by_date_category": ["order_date", "category"],
+    "by_date_region": ["order_date", "customer_region"],
+    "by_category_month": ["year", "month", "category"],
+    "by_region": ["customer_region"],
+    "by_category": ["category"],
+    "by_payment": ["payment_method"],
+    "by_product": ["product_name"],
+    "by_rating": ["customer_rating"],
+}
+
+
+def count_ratings(orders_by_rating):
     """
-    Calculate key performance indicators and chart data from the dataframe.
-    Returns a dict with KPI values formatted for display and raw data for charts.
+    Orders per customer rating, binned server-side: one row per rating
+    ("rating", "count"), always including 1-5 so charts keep every bar.
     """
+    counts = orders_by_rating.copy()
+    counts.index = counts.index.astype(int)
+    counts = counts.reindex(sorted(set(range(1, 6)) | set(counts.index)), fill_value=0)
+    return counts.rename_axis("rating").reset_index(name="count")
+
+
+def format_change(change, trailing=False):
+    """Display text for a year-over-year change in percent (None = unknown)."""
+    period = "last 12 months vs the year before" if trailing else "vs last year"
+    if change is None:
+        return f"N/A {period}"
+    arrow = "▲" if change >= 0 else "▼"
+    return f"{arrow} {abs(change):.1f}% {period}"
+
+
+def format_kpis(total_sales, total_orders, avg_order_value, avg_rating):
+    """Display text for the four KPI cards."""
+    return {
+        "total_sales": f"SAR {total_sales:,.0f}",
+        "total_orders": f"{total_orders:,}",
+        "avg_order_value": f"SAR {avg_order_value:,.2f}",
+        "avg_rating": f"{avg_rating:.1f}" if avg_rating is not None else "N/A",
+    }
+
+
+# ======================================================
+# ---------------- Partial Aggregates -----------------
+# ======================================================
+def _group_sums(frame, keys):
+    if keys:
+        return frame.groupby(keys, as_index=False)[MEASURES].sum()
+    return frame[MEASURES].sum().to_frame().T
+
 
+@timed("partial_kpis")
+def partial_kpis(df):
+    """Additive aggregates of one frame (or partition), keyed like PARTIAL_KEYS."""
     if df is None or df.empty:
+        return {}
+
+    amount = (
+        df["total_amount"]
+        if "total_amount" in df.columns
+        else pd.Series(float("nan"), index=df.index)
+    )
+    rating = (
+        df["customer_rating"]
+        if "customer_rating" in df.columns
+        else pd.Series(float("nan"), index=df.index)
+    )
+    measures = df.assign(
+        total_amount=amount.fillna(0),
+        amount_count=amount.notna().astype(int),
+        orders=1,
+        rating_sum=rating.fillna(0),
+        rating_count=rating.notna().astype(int),
+    )
+
+    return {
+        name: _group_sums(measures, keys)
+        for name, keys in PARTIAL_KEYS.items()
+        if set(keys).issubset(df.columns)
+    }
+
+
+@timed("merge_partial_kpis")
+def merge_partial_kpis(partials):
+    """Combine partial aggregates of several partitions by summing their groups."""
+    merged = {}
+    for name, keys in PARTIAL_KEYS.items():
+        frames = [partial[name] for partial in partials if name in partial]
+        if frames:
+            merged[name] = _group_sums(pd.concat(frames, ignore_index=True), keys)
+    return merged
+
+
+# ======================================================
+# ---------------- KPI Tables -------------------------
+# ======================================================
+@timed("finalize_kpis")
+def finalize_kpis(partial):
+    """
+    Calculate key performance indicators and chart data from partial aggregates.
+    Returns a dict with KPI values formatted for display and raw data for charts.
+    """
+
+    if not partial or partial["totals"]["orders"].iloc[0] == 0:
         return {
             # --- Summary KPIs (for cards) ---
             "total_sales": "SAR 0",
@@ -21,137 +131,167 @@ def calculate_kpis(df):
             "avg_rating": "N/A",
             # --- Chart data ---
             "sales_over_time": pd.DataFrame(),
+            "avg_order_daily": pd.DataFrame(),
             "sales_by_region": pd.DataFrame(),
             "sales_by_category": pd.DataFrame(),
             "orders_by_payment": pd.DataFrame(),
             "top_products": pd.DataFrame(),
             "avg_rating_region": pd.DataFrame(),
+            "rating_counts": pd.DataFrame(columns=["rating", "count"]),
+            "rollups": {},
+            "sales_by_category_quarter": pd.DataFrame(),
         }
 
+    empty = pd.DataFrame()
+
     # ======================================================
     # ---------------- Summary KPI Cards ------------------
     # ======================================================
+    totals = partial["totals"].iloc[0]
 
     # --- Total Sales ---
-    total_sales = df["total_amount"].sum() if "total_amount" in df.columns else 0
-    total_sales_text = f"SAR {total_sales:,.0f}"
+    total_sales = totals["total_amount"]
 
     # --- Total Orders ---
-    total_orders = int(df.shape[0])
-    total_orders_text = f"{total_orders:,}"
+    total_orders = int(totals["orders"])
 
     # --- Average Order Value ---
-    avg_order_value = df["total_amount"].mean() if "total_amount" in df.columns else 0
-    avg_order_value_text = f"SAR {avg_order_value:,.2f}"
+    avg_order_value = (
+        total_sales / totals["amount_count"] if totals["amount_count"] else 0
+    )
 
     # --- Average Rating ---
     avg_rating = (
-        df["customer_rating"].mean() if "customer_rating" in df.columns else None
+        totals["rating_sum"] / totals["rating_count"] if totals["rating_count"] else None
     )
-    avg_rating_text = f"{avg_rating:.1f}" if avg_rating is not None else "N/A"
+    kpi_texts = format_kpis(total_sales, total_orders, avg_order_value, avg_rating)
 
-    # --- Sales by Category per Month ---
-    sales_by_category_month = (
-        df.groupby(["year", "month", "category"], as_index=False)["total_amount"].sum()
-        if {"year", "month", "category", "total_amount"}.issubset(df.columns)
-        else pd.DataFrame()
+    # --- Rating Distribution (pre-binned for the rating charts) ---
+    rating_counts = (
+        count_ratings(partial["by_rating"].set_index("customer_rating")["orders"])
+        if "by_rating" in partial
+        else pd.DataFrame(columns=["rating", "count"])
+    )
+
+    # --- Time Rollups per Category (day -> week -> month -> quarter -> year) ---
+    rollups = (
+        build_rollups(
+            partial["by_date_category"][["order_date", "category", *MEASURES]],
+            keys=["category"],
+        )
+        if "by_date_category" in partial
+        else {}
     )
 
-    if not sales_by_category_month.empty:
+    # --- Sales by Category per Quarter (the home chart's first view) ---
+    sales_by_category_quarter = rollup_rows(rollups, DEFAULT_GRAIN)
+
+    # --- Sales by Category per Month ---
+    if "by_category_month" in partial:
+        sales_by_category_month = partial["by_category_month"][
+            ["year", "month", "category", "total_amount"]
+        ].copy()
         sales_by_category_month["period"] = (
             sales_by_category_month["year"].astype(str)
             + "-"
             + sales_by_category_month["month"].astype(str)
         )
-
-    # --- Sales by Category per Quarter ---
-    if {"year", "month", "category", "total_amount"}.issubset(df.columns):
-        sales_by_category_quarter = (
-            df.copy()
-            .assign(
-                quarter=lambda x: ((x["month"] - 1) // 3 + 1)
-            )  # Convert month to quarter
-            .groupby(["year", "quarter", "category"], as_index=False)["total_amount"]
-            .sum()
-        )
-
-        # Add readable period label for charts
-        sales_by_category_quarter["period"] = (
-            "Q"
-            + sales_by_category_quarter["quarter"].astype(str)
-            + " "
-            + sales_by_category_quarter["year"].astype(str)
-        )
     else:
-        sales_by_category_quarter = pd.DataFrame()
+        sales_by_category_month = empty
 
     # ======================================================
     # ---------------- Chart Data -------------------------
     # ======================================================
+    by_date = partial.get("by_date")
+    by_region = partial.get("by_region")
 
     # --- Sales Over Time ---
     sales_over_time = (
-        df.groupby("order_date", as_index=False)["total_amount"].sum()
-        if "order_date" in df.columns
-        else pd.DataFrame()
+        by_date[["order_date", "total_amount"]] if by_date is not None else empty
+    )
+
+    # --- Daily Sales and Orders, in total and per region / category ---
+    daily = {
+        table: partial[name][[*keys, "total_amount", "orders"]]
+        for table, name, keys in (
+            ("daily_totals", "by_date", ["order_date"]),
+            ("daily_by_region", "by_date_region", ["order_date", "customer_region"]),
+            ("daily_by_category", "by_date_category", ["order_date", "category"]),
+        )
+        if name in partial
+    }
+
+    # --- Average Order Value per Day ---
+    avg_order_daily = (
+        by_date[["order_date"]].assign(
+            total_amount=by_date["total_amount"] / by_date["amount_count"]
+        )
+        if by_date is not None
+        else empty
     )
 
     # --- Sales by Region ---
     sales_by_region = (
-        df.groupby("customer_region", as_index=False)["total_amount"].sum()
-        if "customer_region" in df.columns
-        else pd.DataFrame()
+        by_region[["customer_region", "total_amount"]]
+        if by_region is not None
+        else empty
     )
 
     # --- Sales by Category ---
     sales_by_category = (
-        df.groupby("category", as_index=False)["total_amount"].sum()
-        if "category" in df.columns
-        else pd.DataFrame()
+        partial["by_category"][["category", "total_amount"]]
+        if "by_category" in partial
+        else empty
     )
 
     # --- Orders by Payment Method ---
     orders_by_payment = (
-        df["payment_method"]
-        .value_counts()
-        .reset_index()
-        .rename(columns={"index": "payment_method", "payment_method": "count"})
-        if "payment_method" in df.columns
-        else pd.DataFrame()
+        partial["by_payment"][["payment_method", "orders"]]
+        .rename(columns={"orders": "count"})
+        .sort_values("count", ascending=False, kind="stable")
+        .reset_index(drop=True)
+        if "by_payment" in partial
+        else empty
     )
 
     # --- Top Products ---
     top_products = (
-        df.groupby("product_name", as_index=False)["total_amount"]
-        .sum()
+        partial["by_product"][["product_name", "total_amount"]]
         .sort_values("total_amount", ascending=False)
         .head(10)
-        if "product_name" in df.columns
-        else pd.DataFrame()
+        if "by_product" in partial
+        else empty
     )
 
     # --- Average Rating by Region ---
     avg_rating_region = (
-        df.groupby("customer_region", as_index=False)["customer_rating"].mean()
-        if "customer_rating" in df.columns and "customer_region" in df.columns
-        else pd.DataFrame()
+        by_region[["customer_region"]].assign(
+            customer_rating=by_region["rating_sum"] / by_region["rating_count"]
+        )
+        if by_region is not None and "by_rating" in partial
+        else empty
     )
 
     return {
         # --- Summary KPIs ---
-        "total_sales": total_sales_text,
-        "total_orders": total_orders_text,
-        "avg_order_value": avg_order_value_text,
-        "avg_rating": avg_rating_text,
-        "total_sales": total_sales_text,
-        "sales_by_category": sales_by_category,
+        **kpi_texts,
         "sales_by_category_month": sales_by_category_month,
         # --- Chart Data ---
         "sales_over_time": sales_over_time,
+        "avg_order_daily": avg_order_daily,
         "sales_by_region": sales_by_region,
         "sales_by_category": sales_by_category,
         "orders_by_payment": orders_by_payment,
         "top_products": top_products,
         "avg_rating_region": avg_rating_region,
+        "rating_counts": rating_counts,
         "sales_by_category_quarter": sales_by_category_quarter,
+        "rollups": rollups,
+        **daily,
     }
+
+
+@timed("calculate_kpis")
+def calculate_kpis(df):
+    """KPIs and chart data of a single dataframe (see finalize_kpis)."""
+    return finalize_kpis(partial_kpis(df))
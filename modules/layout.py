@@ -1,8 +1,11 @@
 # modules/layout.py
+import threading
+from collections.abc import Mapping
+
 from dash import dcc, html, dash_table
 import dash_bootstrap_components as dbc
-from modules import style
-import pandas as pd
+from modules import config, style
+from modules.rollups import DEFAULT_GRAIN
 
 table_columns = [
     {"name": "Order Date", "id": "order_date"},
@@ -14,11 +17,56 @@ table_columns = [
     {"name": "Rating", "id": "customer_rating"},
 ]
 
+segment_columns = [
+    {"name": "Segment", "id": "segment"},
+    {"name": "Customers", "id": "customers"},
+    {"name": "Sales (SAR)", "id": "sales"},
+    {"name": "Avg Days Since Last Order", "id": "avg_recency"},
+    {"name": "Avg Orders", "id": "avg_frequency"},
+    {"name": "Avg Sales per Customer", "id": "avg_monetary"},
+]
+
+
+# ======================================================
+# ----------------- Lazy Pages ------------------------
+# ======================================================
+class LazyPages(Mapping):
+    """
+    Route -> page content, built by its factory the first time the route is
+    requested and memoized after that.
+    """
+
+    def __init__(self, factories):
+        self._factories = dict(factories)
+        self._pages = {}
+        self._lock = threading.Lock()
+
+    def __getitem__(self, pathname):
+        if pathname not in self._pages:
+            factory = self._factories[pathname]
+            with self._lock:
+                if pathname not in self._pages:
+                    self._pages[pathname] = factory()
+        return self._pages[pathname]
+
+    def __iter__(self):
+        return iter(self._factories)
 
-def create_layout(
-    df,
+    def __len__(self):
+        return len(self._factories)
+
+    def clear(self):
+        """Forget built pages (e.g. after a dataset reload)."""
+        with self._lock:
+            self._pages.clear()
+
+    def resolve(self, pathname):
+        """Route actually served for a URL pathname (unknown paths show "/")."""
+        return pathname if pathname in self._factories else "/"
+
+
+def create_home_content(
     kpis,
-    columns_to_show,
     fig_total_sales,
     fig_avg_order,
     fig_rating_dist,
@@ -27,24 +75,18 @@ def create_layout(
     fig_rating_pie,
     fig_category_sales_pie,
 ):
-
-    # ======================================================
-    # ----------------- Sidebar Menu ----------------------
-    # ======================================================
-    sidebar = html.Div(
-        [
-            html.H2("SwiftShop", style=style.SIDEBAR_TITLE),
-            dcc.Link("Main dashboard", href="/", style=style.SIDEBAR_LINK),
-            dcc.Link("Order Details", href="/filters", style=style.SIDEBAR_LINK),
-        ],
-        style=style.SIDEBAR_STYLE,
-    )
-
     # ======================================================
     # ----------------- Home Page Content -----------------
     # ======================================================
     home_content = html.Div(
         [
+            # --- KPI refresh: values follow the filters and new dataset versions ---
+            dcc.Interval(
+                id="kpi-refresh",
+                interval=max(config.KPI_REFRESH_SECONDS, 1) * 1000,
+                disabled=not config.KPI_REFRESH_SECONDS,
+            ),
+            dcc.Store(id="kpi-version", storage_type="memory"),
             # --- KPI Cards ---
             dbc.Row(
                 [
@@ -53,7 +95,12 @@ def create_layout(
                             [
                                 html.Div("Total Sales", style=style.KPI_LABEL_STYLE),
                                 html.Div(
-                                    kpis["total_sales"], style=style.KPI_VALUE_STYLE
+                                    kpis["total_sales"],
+                                    id="kpi-total-sales",
+                                    style=style.KPI_VALUE_STYLE,
+                                ),
+                                html.Div(
+                                    id="kpi-sales-yoy", style=style.KPI_CHANGE_STYLE
                                 ),
                             ],
                             style=style.KPI_CARD_STYLE,
@@ -67,7 +114,12 @@ def create_layout(
                                     "Number of Orders", style=style.KPI_LABEL_STYLE
                                 ),
                                 html.Div(
-                                    kpis["total_orders"], style=style.KPI_VALUE_STYLE
+                                    kpis["total_orders"],
+                                    id="kpi-total-orders",
+                                    style=style.KPI_VALUE_STYLE,
+                                ),
+                                html.Div(
+                                    id="kpi-orders-yoy", style=style.KPI_CHANGE_STYLE
                                 ),
                             ],
                             style=style.KPI_CARD_STYLE,
@@ -81,7 +133,9 @@ def create_layout(
                                     "Average Order Value", style=style.KPI_LABEL_STYLE
                                 ),
                                 html.Div(
-                                    kpis["avg_order_value"], style=style.KPI_VALUE_STYLE
+                                    kpis["avg_order_value"],
+                                    id="kpi-avg-order-value",
+                                    style=style.KPI_VALUE_STYLE,
                                 ),
                             ],
                             style=style.KPI_CARD_STYLE,
@@ -93,7 +147,9 @@ def create_layout(
                             [
                                 html.Div("Average Rating", style=style.KPI_LABEL_STYLE),
                                 html.Div(
-                                    kpis["avg_rating"], style=style.KPI_VALUE_STYLE
+                                    kpis["avg_rating"],
+                                    id="kpi-avg-rating",
+                                    style=style.KPI_VALUE_STYLE,
                                 ),
                             ],
                             style=style.KPI_CARD_STYLE,
@@ -108,6 +164,7 @@ def create_layout(
                 [
                     dbc.Col(
                         dcc.Graph(
+                            id="total-sales-chart",
                             figure=fig_total_sales,
                             config=style.GRAPH_CONFIG,
                             style=style.GRAPH_STYLE,
@@ -116,6 +173,7 @@ def create_layout(
                     ),
                     dbc.Col(
                         dcc.Graph(
+                            id="avg-order-chart",
                             figure=fig_avg_order,
                             config=style.GRAPH_CONFIG,
                             style=style.GRAPH_STYLE,
@@ -128,11 +186,28 @@ def create_layout(
             dbc.Row(
                 [
                     dbc.Col(
-                        dcc.Graph(
-                            figure=fig_category_sales_per_month,
-                            config=style.GRAPH_CONFIG,
-                            style=style.GRAPH_STYLE,
-                        ),
+                        [
+                            # Drill-down views, from the full quarters down to
+                            # the clicked period (see callbacks: drill_category_sales)
+                            dcc.Store(
+                                id="rollup-views",
+                                data=[{"grain": DEFAULT_GRAIN}],
+                                storage_type="memory",
+                            ),
+                            dbc.Button(
+                                "⬆️ Up",
+                                id="rollup-up",
+                                n_clicks=0,
+                                size="sm",
+                                style=style.BUTTON,
+                            ),
+                            dcc.Graph(
+                                id="category-rollup-chart",
+                                figure=fig_category_sales_per_month,
+                                config=style.GRAPH_CONFIG,
+                                style=style.GRAPH_STYLE,
+                            ),
+                        ],
                         width=6,
                     ),
                     dbc.Col(
@@ -157,9 +232,20 @@ def create_layout(
         ]
     )
 
+    return home_content
+
+
+def create_filters_content(dataset, fig_sales_growth, fig_top_products):
     # ======================================================
     # ----------------- Filters Page Content -------------
     # ======================================================
+    first_date, last_date = dataset.date_bounds()
+    first_date = first_date.date() if first_date is not None else None
+    last_date = last_date.date() if last_date is not None else None
+
+    # The store filter is only shown when more than one store is loaded
+    multi_store = len(dataset.stores) > 1
+
     filters_content = html.Div(
         [
             html.H3("Order Details", style=style.PAGE_TITLE),
@@ -206,22 +292,10 @@ def create_layout(
                                                     # ------------------- DatePickerRange component -------------------
                                                     dcc.DatePickerRange(
                                                         id="date-picker",
-                                                        min_date_allowed=df[
-                                                            "order_date"
-                                                        ]
-                                                        .min()
-                                                        .date(),
-                                                        max_date_allowed=df[
-                                                            "order_date"
-                                                        ]
-                                                        .max()
-                                                        .date(),
-                                                        start_date=df["order_date"]
-                                                        .min()
-                                                        .date(),
-                                                        end_date=df["order_date"]
-                                                        .max()
-                                                        .date(),
+                                                        min_date_allowed=first_date,
+                                                        max_date_allowed=last_date,
+                                                        start_date=first_date,
+                                                        end_date=last_date,
                                                         display_format="YYYY-MM",
                                                         style=style.FILTER_STYLE,  # your input box style
                                                         className="custom-date-picker",  # targets the popup
@@ -230,6 +304,20 @@ def create_layout(
                                             ),
                                             width=3,
                                         ),
+                                        dbc.Col(
+                                            dcc.Dropdown(
+                                                id="store-dropdown",
+                                                multi=True,
+                                                placeholder="Select Store",
+                                                options=[
+                                                    {"label": s, "value": s}
+                                                    for s in dataset.stores
+                                                ],
+                                                style=style.FILTER_STYLE,
+                                            ),
+                                            width=3,
+                                            className=None if multi_store else "d-none",
+                                        ),
                                         dbc.Col(
                                             dcc.Dropdown(
                                                 id="region-dropdown",
@@ -237,14 +325,13 @@ def create_layout(
                                                 placeholder="Select Region",
                                                 options=[
                                                     {"label": r, "value": r}
-                                                    for r in df[
+                                                    for r in dataset.distinct(
                                                         "customer_region"
-                                                    ].unique()
-                                                    if pd.notnull(r)
+                                                    )
                                                 ],
                                                 style=style.FILTER_STYLE,
                                             ),
-                                            width=4,
+                                            width=3 if multi_store else 4,
                                         ),
                                         dbc.Col(
                                             dcc.Dropdown(
@@ -253,12 +340,22 @@ def create_layout(
                                                 placeholder="Select Category",
                                                 options=[
                                                     {"label": c, "value": c}
-                                                    for c in df["category"].unique()
-                                                    if pd.notnull(c)
+                                                    for c in dataset.distinct("category")
                                                 ],
                                                 style=style.FILTER_STYLE,
                                             ),
-                                            width=4,
+                                            width=3 if multi_store else 4,
+                                        ),
+                                        # Options come from the product search callback
+                                        dbc.Col(
+                                            dcc.Dropdown(
+                                                id="product-dropdown",
+                                                multi=True,
+                                                placeholder="Search Product",
+                                                options=[],
+                                                style=style.FILTER_STYLE,
+                                            ),
+                                            width=6,
                                         ),
                                     ],
                                     style=style.FILTER_ROW,
@@ -274,8 +371,16 @@ def create_layout(
                             # Left column: line chart above table
                             dbc.Col(
                                 [
+                                    dbc.Progress(
+                                        id="dashboard-progress",
+                                        value=0,
+                                        striped=True,
+                                        animated=True,
+                                        style=style.PROGRESS_HIDDEN,
+                                    ),
                                     dcc.Graph(
                                         id="sales-line",
+                                        figure=fig_sales_growth,
                                         config=style.GRAPH_CONFIG,
                                         style=style.GRAPH_STYLE,
                                     ),
@@ -291,6 +396,8 @@ def create_layout(
                                     dash_table.DataTable(
                                         id="orders-table",
                                         columns=table_columns,
+                                        page_action="custom",  # paged on the server
+                                        page_current=0,
                                         page_size=10,
                                         column_selectable="multi",
                                         style_table=style.TABLE_STYLE,
@@ -304,6 +411,7 @@ def create_layout(
                             dbc.Col(
                                 dcc.Graph(
                                     id="top-products",
+                                    figure=fig_top_products,
                                     config=style.GRAPH_CONFIG,
                                     style=style.GRAPH_STYLE_VERTICAL,
                                 ),
@@ -317,6 +425,83 @@ def create_layout(
         ]
     )
 
+    return filters_content
+
+
+def create_customers_content(segments, fig_retention, fig_segments):
+    # ======================================================
+    # ----------------- Customers Page Content -----------
+    # ======================================================
+    segment_rows = segments.round(
+        {"sales": 2, "avg_recency": 0, "avg_frequency": 1, "avg_monetary": 2}
+    ).to_dict("records")
+
+    customers_content = html.Div(
+        [
+            html.H3("Customers", style=style.PAGE_TITLE),
+            dbc.Row(
+                [
+                    dbc.Col(
+                        dcc.Graph(
+                            id="cohort-retention-chart",
+                            figure=fig_retention,
+                            config=style.GRAPH_CONFIG,
+                            style=style.GRAPH_STYLE,
+                        ),
+                        width=7,
+                    ),
+                    dbc.Col(
+                        dcc.Graph(
+                            id="rfm-segments-chart",
+                            figure=fig_segments,
+                            config=style.GRAPH_CONFIG,
+                            style=style.GRAPH_STYLE,
+                        ),
+                        width=5,
+                    ),
+                ],
+                style=style.CARD_STYLE,
+            ),
+            dbc.Row(
+                dbc.Col(
+                    dash_table.DataTable(
+                        id="rfm-segments-table",
+                        columns=segment_columns,
+                        data=segment_rows,
+                        style_table=style.TABLE_STYLE,
+                        style_cell=style.TABLE_CELL_STYLE,
+                        style_header=style.TABLE_HEADER_STYLE,
+                        style_data_conditional=style.TABLE_CONDITIONAL_STYLE,
+                    ),
+                    width=12,
+                ),
+                style=style.CARD_STYLE,
+            ),
+        ]
+    )
+
+    return customers_content
+
+
+def create_layout(page_dict):
+    """
+    App shell: sidebar, footer and an empty content area. Page contents come
+    from page_dict (usually LazyPages) and are fetched by the browser per route.
+    """
+
+    # ======================================================
+    # ----------------- Sidebar Menu ----------------------
+    # ======================================================
+    sidebar = html.Div(
+        [
+            html.H2("SwiftShop", style=style.SIDEBAR_TITLE),
+            dcc.Link("Main dashboard", href="/", style=style.SIDEBAR_LINK),
+            dcc.Link("Order Details", href="/filters", style=style.SIDEBAR_LINK),
+            dcc.Link("Customers", href="/customers", style=style.SIDEBAR_LINK),
+        ],
+        style=style.SIDEBAR_STYLE,
+    )
+
     # ======================================================
     # ----------------- Layout: Sidebar + Content --------
     # ======================================================
@@ -328,20 +513,20 @@ def create_layout(
                     sidebar,  # Left sidebar
                     html.Div(
                         id="page-content",
-                        children=home_content,
                         style=style.CONTENT_STYLE,
-                    ),  # Right content
+                    ),  # Right content, filled clientside (assets/clientside.js)
                 ],
                 style=style.MAIN_DIV_STYLE,  # Moved inline style
             ),
             html.Div("© 2025 SwiftShop Analytics", style=style.FOOTER_STYLE),
-            dcc.Store(id="filtered-data", storage_type="memory"),
+            # Latest filter values, shared with the home page KPI cards
+            dcc.Store(id="filter-state", storage_type="memory"),
         ]
     )
 
     # ======================================================
     # ----------------- Navigation dictionary ------------
     # ======================================================
-    layout.page_dict = {"/": home_content, "/filters": filters_content}
+    layout.page_dict = page_dict
 
     return layout
@@ -0,0 +1,157 @@
+# modules/layout_cache.py
+# ======================================================
+# --------------- Cached Layout Response --------------
+# ======================================================
+# The app shell and each page never change after they are built, so they
+# are serialized once and served from the same bytes with an ETag.
+# Browsers revalidate and get a 304 on repeat visits. Compressed variants
+# (modules/compression.py) are also built once, each with its own ETag.
+#
+# The shell is a memoized app.layout function; its cached bytes are served by
+# a before_request hook, ahead of Dash's own /_dash-layout view.
+
+import functools
+import hashlib
+import threading
+
+import flask
+from plotly.io.json import to_json_plotly
+
+from modules.compression import compress, negotiate
+
+try:
+    import orjson  # noqa: F401  (fast encoder, optional)
+
+    JSON_ENGINE = "orjson"
+except ImportError:
+    JSON_ENGINE = "json"
+
+
+class CachedJSON:
+    """Serialized JSON bytes of produce() and their ETag, built on first use."""
+
+    def __init__(self, produce):
+        self.produce = produce
+        self.body = None
+        self.etag = None
+        self._encoded = {}  # encoding -> compressed body
+        self._lock = threading.Lock()
+
+    def get(self):
+        if self.body is None:
+            with self._lock:
+                if self.body is None:
+                    body = to_json_plotly(self.produce(), engine=JSON_ENGINE)
+                    body = body.encode("utf-8")
+                    self.etag = hashlib.sha1(body).hexdigest()
+                    self.body = body
+        return self.body, self.etag
+
+    def restore(self, body, etag):
+        """Use bytes serialized earlier (e.g. from a warm-start snapshot)."""
+        with self._lock:
+            self.body = body
+            self.etag = etag
+            self._encoded = {}
+
+    def invalidate(self):
+        with self._lock:
+            self.body = None
+            self.etag = None
+            self._encoded = {}
+
+    def serialized(self):
+        """(body, etag) if serialized already, else None; never builds."""
+        with self._lock:
+            return (self.body, self.etag) if self.body is not None else None
+
+    def nbytes(self):
+        """Size of the serialized body and its compressed variants."""
+        with self._lock:
+            encoded = sum(len(body) for _etag, body in self._encoded.values())
+            return len(self.body or b"") + encoded
+
+    def drop_encoded(self):
+        """Forget the compressed variants; they are rebuilt on the next request."""
+        with self._lock:
+            self._encoded = {}
+
+    def encoded(self, encoding):
+        """The body compressed with encoding, built once at the best level."""
+        body, etag = self.get()
+        encoded = self._encoded.get(encoding)
+        if encoded is None or encoded[0] != etag:
+            encoded = (etag, compress(body, encoding, best=True))
+            with self._lock:
+                self._encoded[encoding] = encoded
+        return encoded[1]
+
+    def serve(self):
+        body, etag = self.get()
+        encoding = negotiate()
+        if encoding is not None:
+            etag = f"{etag}-{encoding}"  # one ETag per representation
+
+        if etag in flask.request.if_none_match:
+            response = flask.Response(status=304)
+        elif encoding is not None:
+            response = flask.Response(
+                self.encoded(encoding), mimetype="application/json"
+            )
+            response.headers["Content-Encoding"] = encoding
+        else:
+            response = flask.Response(body, mimetype="application/json")
+        response.vary.add("Accept-Encoding")
+        response.set_etag(etag)
+        response.headers["Cache-Control"] = "no-cache"  # always revalidate
+        return response
+
+
+def memoized_layout(build):
+    """A layout function for app.layout calling build() only once."""
+    layout = []
+    lock = threading.Lock()
+
+    @functools.wraps(build)
+    def cached_layout():
+        if not layout:
+            with lock:
+                if not layout:
+                    layout.append(build())
+        return layout[0]
+
+    return cached_layout
+
+
+def install_layout_cache(app, page_dict):
+    """
+    Serve /_dash-layout (app.layout, a memoized_layout) and
+    /_page?pathname=<route> from cached bytes.
+
+    page_dict is the layout's LazyPages: a page is built (and serialized) the
+    first time its route is requested. Returns the layout and page caches.
+    """
+    prefix = app.config.routes_pathname_prefix
+    layout_path = prefix + "_dash-layout"
+
+    layout_cache = CachedJSON(app.layout)
+
+    # Registered after Dash's own setup hook; returning a response here skips
+    # Dash's view, which would serialize the layout again
+    @app.server.before_request
+    def serve_layout():
+        if flask.request.path == layout_path and flask.request.method == "GET":
+            return layout_cache.serve()
+        return None
+
+    page_caches = {
+        route: CachedJSON(functools.partial(page_dict.__getitem__, route))
+        for route in page_dict
+    }
+
+    def serve_page():
+        route = page_dict.resolve(flask.request.args.get("pathname", "/"))
+        return page_caches[route].serve()
+
+    app.server.add_url_rule(prefix + "_page", endpoint=prefix + "_page", view_func=serve_page)
+    return layout_cache, page_caches
@@ -0,0 +1,311 @@
+# modules/memory.py
+# ======================================================
+# ---------------- Memory Accounting ------------------
+# ======================================================
+# What the in-memory dataset costs: deep per-column sizes of the orders
+# (string values included), the derived date / partition columns, the
+# partial aggregates and cubes, the KPI tables and the caches built from
+# them. Served as a report on config.MEMORY_PATH.
+#
+# With a budget (SWIFTSHOP_MEMORY_BUDGET_MB) the steps below are applied in
+# order, after every (re)load, until the accounted bytes fit:
+#   1. drop derived columns nothing reads after loading (recomputable)
+#   2. downcast numeric columns, only where no value changes
+#   3. store repetitive strings as categories, intern the others
+#   4. evict caches (they are rebuilt on demand)
+# The budget covers the accounted objects, not the whole process: Python,
+# pandas and Dash themselves come on top.
+
+import sys
+import threading
+
+import flask
+import numpy as np
+import pandas as pd
+
+from modules import config
+
+try:
+    import resource  # Unix only
+except ImportError:
+    resource = None
+
+# Columns derived from the others while loading (data_clean, partition_store)
+DERIVED_COLUMNS = ["year", "month", "month_name", "store"]
+# ... of which nothing reads these once partials and cubes are built:
+# month_name is order_date.dt.strftime("%B"), store is Partition.store
+DROPPABLE_COLUMNS = ["month_name", "store"]
+
+# Strings with at most this share of distinct values become categories
+CATEGORY_MAX_UNIQUE_RATIO = 0.5
+
+REPORT_COLUMNS = ["section", "name", "dtype", "rows", "bytes", "derived"]
+
+
+def deep_bytes(obj):
+    """Deep size in bytes of frames, arrays, bytes and dicts / lists of them."""
+    if isinstance(obj, pd.DataFrame):
+        return int(obj.memory_usage(index=True, deep=True).sum())
+    if isinstance(obj, (pd.Series, pd.Index)):
+        return int(obj.memory_usage(deep=True))
+    if isinstance(obj, np.ndarray):
+        return obj.nbytes
+    if isinstance(obj, dict):
+        return sum(deep_bytes(value) for value in obj.values())
+    if isinstance(obj, (list, tuple)):
+        return sum(deep_bytes(value) for value in obj)
+    return sys.getsizeof(obj) if obj is not None else 0
+
+
+def format_bytes(size):
+    for unit in ("B", "KiB", "MiB"):
+        if size < 1024:
+            return f"{size:,.1f} {unit}"
+        size /= 1024
+    return f"{size:,.2f} GiB"
+
+
+def peak_rss_bytes():
+    """Peak resident set size of this process (None where unavailable)."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024  # Linux: KiB
+
+
+# ======================================================
+# ---------------- Column Transformations -------------
+# ======================================================
+def downcast_numeric(series):
+    """The smallest numeric dtype holding exactly the same values."""
+    if pd.api.types.is_bool_dtype(series) or not pd.api.types.is_numeric_dtype(
+        series
+    ):
+        return series
+    if pd.api.types.is_integer_dtype(series):
+        unsigned = series.min() >= 0 if len(series) else False
+        return pd.to_numeric(series, downcast="unsigned" if unsigned else "integer")
+    if series.dtype == np.float64:
+        narrow = series.astype(np.float32)
+        exact = np.array_equal(
+            narrow.to_numpy(np.float64), series.to_numpy(), equal_nan=True
+        )
+        if exact:
+            return narrow
+    return series
+
+
+def _is_string_column(series):
+    return series.dtype == object and series.dropna().map(type).eq(str).all()
+
+
+def _intern(series):
+    return series.map(lambda v: sys.intern(v) if isinstance(v, str) else v)
+
+
+class MemoryAccount:
+    """Memory report and budget mode for one dataset and its caches."""
+
+    def __init__(self, dataset, budget_mb=None):
+        self.dataset = dataset
+        self.budget_mb = config.MEMORY_BUDGET_MB if budget_mb is None else budget_mb
+        self.applied = []  # budget steps applied on the last enforce()
+        self._caches = {}  # name -> (measure, evict)
+        self._lock = threading.Lock()
+
+    def watch(self, name, measure, evict=None):
+        """Account a cache: measure() -> bytes, evict() frees it."""
+        self._caches[name] = (measure, evict)
+
+    # ======================================================
+    # ---------------- Report -----------------------------
+    # ======================================================
+    def report(self):
+        """One row per orders column, aggregate, KPI table and cache."""
+        rows = []
+        frames = [p.df for p in self.dataset.partitions if p.df is not None]
+        columns = list(dict.fromkeys(c for df in frames for c in df.columns))
+        for column in columns:
+            parts = [df[column] for df in frames if column in df.columns]
+            rows.append(
+                (
+                    "orders",
+                    column,
+                    str(parts[0].dtype),
+                    sum(len(part) for part in parts),
+                    sum(
+                        int(part.memory_usage(index=False, deep=True))
+                        for part in parts
+                    ),
+                    column in DERIVED_COLUMNS,
+                )
+            )
+        if frames:
+            rows.append(
+                (
+                    "orders",
+                    "(index)",
+                    str(frames[0].index.dtype),
+                    sum(len(df) for df in frames),
+                    sum(int(df.index.memory_usage(deep=True)) for df in frames),
+                    False,
+                )
+            )
+
+        partials = {}
+        for partition in self.dataset.partitions:
+            for key, table in partition.partial.items():
+                partials[key] = partials.get(key, 0) + deep_bytes(table)
+        rows.extend(
+            ("partials", key, "", None, size, False) for key, size in partials.items()
+        )
+        rows.append(
+            (
+                "partials",
+                "kpi cube",
+                "",
+                sum(len(p.cube) for p in self.dataset.partitions),
+                sum(deep_bytes(p.cube) for p in self.dataset.partitions),
+                False,
+            )
+        )
+
+        for key, table in (self.dataset.kpis or {}).items():
+            rows.append(
+                (
+                    "kpis",
+                    key,
+                    "",
+                    len(table) if hasattr(table, "__len__") else None,
+                    deep_bytes(table),
+                    False,
+                )
+            )
+
+        for name, (measure, _evict) in self._caches.items():
+            rows.append(("caches", name, "", None, int(measure()), False))
+
+        return pd.DataFrame(rows, columns=REPORT_COLUMNS)
+
+    def total_bytes(self, report=None):
+        report = self.report() if report is None else report
+        return int(report["bytes"].sum())
+
+    def render(self, report=None):
+        """The report as plain text, largest items first within each section."""
+        report = self.report() if report is None else report
+        lines = []
+        for section, rows in report.groupby("section", sort=False):
+            lines.append(f"[{section}] {format_bytes(rows['bytes'].sum())}")
+            for row in rows.sort_values("bytes", ascending=False).itertuples():
+                derived = " (derived)" if row.derived else ""
+                lines.append(
+                    f"  {row.name:<28} {row.dtype:<16} {format_bytes(row.bytes):>12}"
+                    f"{derived}"
+                )
+        lines.append(f"total accounted: {format_bytes(self.total_bytes(report))}")
+        if self.budget_mb:
+            steps = ", ".join(self.applied) or "none needed"
+            lines.append(f"budget: {self.budget_mb:,.0f} MiB (applied: {steps})")
+        peak = peak_rss_bytes()
+        if peak is not None:
+            lines.append(f"process peak RSS: {format_bytes(peak)}")
+        return "\n".join(lines) + "\n"
+
+    # ======================================================
+    # ---------------- Budget Mode ------------------------
+    # ======================================================
+    def enforce(self, _dataset=None):
+        """
+        Apply budget steps until the accounted bytes fit config.MEMORY_BUDGET_MB.
+        Usable as a dataset.on_change listener. Returns the steps applied.
+        """
+        if not self.budget_mb:
+            return []
+        budget = self.budget_mb * 2**20
+        steps = [
+            ("drop derived columns", self._drop_derived_columns),
+            ("downcast numerics", self._downcast_numerics),
+            ("categorize strings", self._categorize_strings),
+            ("evict caches", self._evict_caches),
+        ]
+        with self._lock:
+            self.applied = []
+            for name, step in steps:
+                if self.total_bytes() <= budget:
+                    break
+                step()
+                self.applied.append(name)
+        return self.applied
+
+    def _map_frames(self, transform):
+        """Replace every in-memory partition frame by transform(df)."""
+        for partition in self.dataset.partitions:
+            if partition.df is not None:
+                partition.df = transform(partition.df)
+        # Cached selections still reference the old frames
+        self.dataset.selections.clear()
+
+    def _drop_derived_columns(self):
+        self._map_frames(
+            lambda df: df.drop(columns=DROPPABLE_COLUMNS, errors="ignore")
+        )
+
+    def _downcast_numerics(self):
+        self._map_frames(
+            lambda df: df.assign(**{c: downcast_numeric(df[c]) for c in df.columns})
+        )
+
+    def _categorize_strings(self):
+        frames = [p.df for p in self.dataset.partitions if p.df is not None]
+        columns = {c for df in frames for c in df.columns if _is_string_column(df[c])}
+        dtypes = {}
+        for column in sorted(columns):
+            parts = [df[column] for df in frames if column in df.columns]
+            values = pd.unique(pd.concat(parts, ignore_index=True).dropna())
+            rows = sum(len(part) for part in parts)
+            if rows and len(values) <= rows * CATEGORY_MAX_UNIQUE_RATIO:
+                # One dtype for every partition, so selections concat as categories
+                dtypes[column] = pd.CategoricalDtype(sorted(values))
+
+        def convert(df):
+            converted = {}
+            for column in columns & set(df.columns):
+                if column in dtypes:
+                    converted[column] = df[column].astype(dtypes[column])
+                else:
+                    converted[column] = _intern(df[column])
+            return df.assign(**converted)
+
+        self._map_frames(convert)
+
+    def _evict_caches(self):
+        for _measure, evict in self._caches.values():
+            if evict is not None:
+                evict()
+
+
+def install_memory(app, account):
+    """Serve the memory report on config.MEMORY_PATH (?format=json for JSON)."""
+    if not config.MEMORY_PATH:
+        return
+
+    def serve_memory():
+        report = account.report()
+        if flask.request.args.get("format") == "json":
+            return flask.jsonify(
+                {
+                    "total_bytes": account.total_bytes(report),
+                    "budget_mb": account.budget_mb,
+                    "applied": account.applied,
+                    "peak_rss_bytes": peak_rss_bytes(),
+                    "items": report.astype(object)
+                    .where(report.notna(), None)
+                    .to_dict("records"),
+                }
+            )
+        return flask.Response(account.render(report), mimetype="text/plain")
+
+    app.server.add_url_rule(
+        config.MEMORY_PATH, endpoint="swiftshop_memory", view_func=serve_memory
+    )
@@ -0,0 +1,244 @@
+# modules/metrics.py
+# ======================================================
+# ---------------- Runtime Metrics --------------------
+# ======================================================
+# Latency / size histograms and counters for the server callbacks and the
+# data preparation stages, served in the Prometheus text format so p99
+# filter latency can be graphed and alerted on (histogram_quantile).
+#
+# Values are kept per process: with several server workers, scrape each one.
+
+import bisect
+import functools
+import threading
+import time
+
+import flask
+
+from modules import config
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+BYTES_BUCKETS = (1e3, 1e4, 1e5, 1e6, 1e7)
+ROWS_BUCKETS = (0, 10, 100, 1e3, 1e4, 1e5, 1e6)
+
+_registry = []
+_lock = threading.Lock()
+
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    pairs = ",".join(
+        '{}="{}"'.format(name, str(value).replace("\\", "\\\\").replace('"', '\\"'))
+        for name, value in labels
+    )
+    return "{" + pairs + "}"
+
+
+def _format_value(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+# ======================================================
+# ---------------- Metric Types -----------------------
+# ======================================================
+class Histogram:
+    def __init__(self, name, description, buckets):
+        self.name = name
+        self.description = description
+        self.buckets = tuple(float(bound) for bound in buckets)
+        self._series = {}  # labels -> [per-bucket counts, sum, count]
+        _registry.append(self)
+
+    def observe(self, value, **labels):
+        key = tuple(sorted(labels.items()))
+        index = bisect.bisect_left(self.buckets, value)
+        with _lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * len(self.buckets), 0.0, 0]
+            if index < len(self.buckets):
+                series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def render(self):
+        lines = [
+            f"# HELP {self.name} {self.description}",
+            f"# TYPE {self.name} histogram",
+        ]
+        with _lock:
+            series = {
+                key: (list(counts), total, count)
+                for key, (counts, total, count) in self._series.items()
+            }
+        for key, (counts, total, count) in sorted(series.items()):
+            cumulative = 0
+            bounds = [_format_value(bound) for bound in self.buckets] + ["+Inf"]
+            for le, bucket_count in zip(bounds, counts + [count]):
+                cumulative = count if le == "+Inf" else cumulative + bucket_count
+                labels = _format_labels(key + (("le", le),))
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(key)} {_format_value(total)}")
+            lines.append(f"{self.name}_count{_format_labels(key)} {count}")
+        return lines
+
+
+class Counter:
+    def __init__(self, name, description):
+        self.name = name
+        self.description = description
+        self._values = {}
+        _registry.append(self)
+
+    def inc(self, amount=1, **labels):
+        key = tuple(sorted(labels.items()))
+        with _lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self):
+        lines = [
+            f"# HELP {self.name} {self.description}",
+            f"# TYPE {self.name} counter",
+        ]
+        with _lock:
+            values = dict(self._values)
+        for key, value in sorted(values.items()):
+            lines.append(f"{self.name}{_format_labels(key)} {_format_value(value)}")
+        return lines
+
+
+class CacheStats:
+    """Hit / miss counters read from objects with .hits and .misses at scrape time."""
+
+    def __init__(self, name, description):
+        self.name = name
+        self.description = description
+        self._caches = {}
+        _registry.append(self)
+
+    def watch(self, cache_name, cache):
+        self._caches[cache_name] = cache
+
+    def render(self):
+        lines = [
+            f"# HELP {self.name} {self.description}",
+            f"# TYPE {self.name} counter",
+        ]
+        for cache_name, cache in sorted(self._caches.items()):
+            for result, value in (("hit", cache.hits), ("miss", cache.misses)):
+                labels = _format_labels((("cache", cache_name), ("result", result)))
+                lines.append(f"{self.name}{labels} {value}")
+        return lines
+
+
+# ======================================================
+# ---------------- Dashboard Metrics ------------------
+# ======================================================
+CALLBACK_SECONDS = Histogram(
+    "swiftshop_callback_duration_seconds",
+    "Server time per callback request.",
+    LATENCY_BUCKETS,
+)
+CALLBACK_BYTES = Histogram(
+    "swiftshop_callback_response_bytes",
+    "Size of callback responses.",
+    BYTES_BUCKETS,
+)
+CALLBACK_ERRORS = Counter(
+    "swiftshop_callback_errors_total",
+    "Callback requests that failed with a server error.",
+)
+STAGE_SECONDS = Histogram(
+    "swiftshop_stage_duration_seconds",
+    "Time spent in each data preparation stage.",
+    LATENCY_BUCKETS,
+)
+SELECTION_ROWS = Histogram(
+    "swiftshop_selection_rows",
+    "Orders left after applying the dashboard filters.",
+    ROWS_BUCKETS,
+)
+ANOMALIES = Counter(
+    "swiftshop_anomalies_total",
+    "Daily sales / order count anomalies found in new data, by dimension.",
+)
+QUARANTINED_ROWS = Counter(
+    "swiftshop_quarantined_rows_total",
+    "Orders failing a validation rule, left out of the dataset, by store and rule.",
+)
+CACHE_REQUESTS = CacheStats(
+    "swiftshop_cache_requests_total",
+    "Cache lookups by cache and result.",
+)
+
+
+def timed(stage):
+    """Decorator recording the duration of every call in STAGE_SECONDS."""
+
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                STAGE_SECONDS.observe(time.perf_counter() - start, stage=stage)
+
+        return wrapper
+
+    return decorator
+
+
+def render():
+    """All metrics in the Prometheus text exposition format."""
+    lines = []
+    for metric in _registry:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+# ======================================================
+# ---------------- Flask Integration ------------------
+# ======================================================
+def callback_labels(app, output):
+    """callback (function name) and output (first output id) labels."""
+    first_output = output.lstrip(".").split("...")[0].rsplit(".", 1)[0]
+    entry = app.callback_map.get(output, {})
+    callback = getattr(entry.get("callback"), "__name__", first_output)
+    return {"callback": callback, "output": first_output}
+
+
+def install_metrics(app):
+    """Time every callback request and serve the metrics on config.METRICS_PATH."""
+    if not config.METRICS:
+        return
+
+    update_path = app.config.routes_pathname_prefix + "_dash-update-component"
+    server = app.server
+
+    @server.before_request
+    def start_timer():
+        if flask.request.path == update_path:
+            flask.g.callback_start = time.perf_counter()
+
+    @server.after_request
+    def record_callback(response):
+        start = flask.g.pop("callback_start", None)
+        if start is None:
+            return response
+        body = flask.request.get_json(silent=True) or {}
+        labels = callback_labels(app, body.get("output", ""))
+        CALLBACK_SECONDS.observe(time.perf_counter() - start, **labels)
+        if not response.direct_passthrough:
+            CALLBACK_BYTES.observe(response.calculate_content_length() or 0, **labels)
+        if response.status_code >= 500:
+            CALLBACK_ERRORS.inc(**labels)
+        return response
+
+    def serve_metrics():
+        return flask.Response(render(), mimetype="text/plain; version=0.0.4")
+
+    server.add_url_rule(
+        config.METRICS_PATH, endpoint="swiftshop_metrics", view_func=serve_metrics
+    )
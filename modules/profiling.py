@@ -0,0 +1,143 @@
+# modules/profiling.py
+# ======================================================
+# ------------- Stage Profiling (opt-in) --------------
+# ======================================================
+# With SWIFTSHOP_PROFILE=1 every callback request is traced: the request and
+# the pipeline stages inside it (filter masking, groupby, figure building,
+# record serialization, ...) become events of a Chrome trace file, one file
+# per request. Open them in chrome://tracing, Perfetto or speedscope.
+#
+# Allocations are sampled with tracemalloc: each stage records the memory it
+# left allocated, each request its peak. tracemalloc counts the whole process,
+# so profiled requests run one at a time (per worker) and the numbers are
+# those of the request alone. Tracing memory and serializing requests slow
+# the app down, so keep this mode off in production.
+
+import contextlib
+import itertools
+import json
+import os
+import re
+import threading
+import time
+import tracemalloc
+
+import flask
+
+from modules import config
+from modules.metrics import callback_labels
+
+_local = threading.local()
+_file_numbers = itertools.count()
+# Held from the start of a profiled request to its teardown
+_request_lock = threading.Lock()
+
+
+class Trace:
+    """Timed events of one request, in Chrome trace event format."""
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.events = []
+
+    def add(self, name, start, end, **args):
+        self.events.append(
+            {
+                "name": name,
+                "ph": "X",  # complete event: start + duration
+                "ts": (start - self.start) * 1e6,  # microseconds
+                "dur": (end - start) * 1e6,
+                "pid": os.getpid(),
+                "tid": threading.get_ident(),
+                "args": args,
+            }
+        )
+
+    def write(self, path):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(path, "w", encoding="utf-8") as trace_file:
+            json.dump({"traceEvents": self.events, "displayTimeUnit": "ms"}, trace_file)
+
+
+@contextlib.contextmanager
+def stage(name):
+    """Record the enclosed block as a stage of the current request's trace."""
+    trace = getattr(_local, "trace", None)
+    if trace is None:
+        yield
+        return
+
+    allocated = tracemalloc.get_traced_memory()[0]
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        end = time.perf_counter()
+        trace.add(
+            name,
+            start,
+            end,
+            allocated_bytes=tracemalloc.get_traced_memory()[0] - allocated,
+        )
+
+
+def install_profiling(app):
+    """Trace callback requests into config.PROFILE_DIR when profiling is enabled."""
+    if not config.PROFILE:
+        return
+
+    if not tracemalloc.is_tracing():
+        tracemalloc.start()
+
+    update_path = app.config.routes_pathname_prefix + "_dash-update-component"
+    server = app.server
+
+    @server.before_request
+    def start_trace():
+        if flask.request.path == update_path:
+            _request_lock.acquire()
+            _local.locked = True
+            tracemalloc.reset_peak()
+            _local.trace = Trace()
+
+    @server.after_request
+    def write_trace(response):
+        trace = getattr(_local, "trace", None)
+        if trace is None:
+            return response
+        _local.trace = None
+
+        end = time.perf_counter()
+        duration_ms = (end - trace.start) * 1000
+        if duration_ms < config.PROFILE_MIN_MS:
+            return response
+
+        body = flask.request.get_json(silent=True) or {}
+        labels = callback_labels(app, body.get("output", ""))
+        trace.add(
+            labels["callback"],
+            trace.start,
+            end,
+            output=labels["output"],
+            status=response.status_code,
+            response_bytes=(
+                0 if response.direct_passthrough else response.calculate_content_length()
+            ),
+            peak_traced_bytes=tracemalloc.get_traced_memory()[1],
+        )
+
+        name = "{}-{:04d}-{:.0f}ms-{}.json".format(
+            time.strftime("%Y%m%d-%H%M%S"),
+            next(_file_numbers) % 10000,
+            duration_ms,
+            re.sub(r"[^\w-]", "_", labels["callback"]),
+        )
+        trace.write(os.path.join(config.PROFILE_DIR, name))
+        return response
+
+    @server.teardown_request
+    def drop_trace(_error):
+        _local.trace = None  # never leak into the thread's next request
+        if getattr(_local, "locked", False):
+            _local.locked = False
+            _request_lock.release()
@@ -0,0 +1,113 @@
+# modules/rollups.py
+# ======================================================
+# ---------------- Time Rollups -----------------------
+# ======================================================
+# Sales pre-aggregated at every grain of the time hierarchy
+# day -> week -> month -> quarter -> year. They are built once per dataset
+# version (kpi_calculations.finalize_kpis) from the daily partial aggregates:
+# weeks and months are summed from days, quarters from months and years from
+# quarters. Charts at any grain, and every drill-down step, read a slice of
+# one of these small tables instead of the orders.
+
+import numpy as np
+import pandas as pd
+
+from modules.metrics import timed
+
+GRAINS = ["year", "quarter", "month", "week", "day"]  # coarse -> fine
+DEFAULT_GRAIN = "quarter"
+
+GRAIN_TITLES = {
+    "year": "Yearly",
+    "quarter": "Quarterly",
+    "month": "Monthly",
+    "week": "Weekly",
+    "day": "Daily",
+}
+
+# Finer grain each rollup is summed from, and its pandas period frequency
+# ("W": weeks running Monday to Sunday)
+_SOURCES = {
+    "week": ("day", "W"),
+    "month": ("day", "M"),
+    "quarter": ("month", "Q"),
+    "year": ("quarter", "Y"),
+}
+PERIOD_FREQUENCIES = {
+    "day": "D",
+    **{grain: freq for grain, (_, freq) in _SOURCES.items()},
+}
+
+_LABEL_FORMATS = {
+    "year": "%Y",
+    "month": "%b %Y",
+    "week": "Week of %Y-%m-%d",
+    "day": "%Y-%m-%d",
+}
+
+
+def finer_grain(grain):
+    """The grain a period of this grain drills down to (None for days)."""
+    index = GRAINS.index(grain)
+    return GRAINS[index + 1] if index + 1 < len(GRAINS) else None
+
+
+def coarser_grain(grain):
+    """The grain above this one (None for years)."""
+    index = GRAINS.index(grain)
+    return GRAINS[index - 1] if index > 0 else None
+
+
+def period_end(grain, start):
+    """First day after the period of this grain starting at start."""
+    return (pd.Period(start, PERIOD_FREQUENCIES[grain]) + 1).start_time
+
+
+def period_labels(grain, periods):
+    """Display labels for a series of period start dates."""
+    if grain == "quarter":
+        return "Q" + periods.dt.quarter.astype(str) + " " + periods.dt.year.astype(str)
+    return periods.dt.strftime(_LABEL_FORMATS[grain])
+
+
+def period_label(grain, start):
+    return period_labels(grain, pd.Series([pd.Timestamp(start)])).iloc[0]
+
+
+@timed("build_rollups")
+def build_rollups(daily, keys=()):
+    """
+    Rollups of a daily aggregate frame (order_date, *keys, additive measures).
+
+    Returns grain -> frame of (period, *keys, measures) sorted by period, where
+    period is the first day of the day / week / month / quarter / year.
+    """
+    keys = list(keys)
+    measures = [c for c in daily.columns if c not in ["order_date", *keys]]
+
+    day = daily.rename(columns={"order_date": "period"})
+    day = day[day["period"].notna()].sort_values(["period", *keys], kind="stable")
+    rollups = {"day": day.reset_index(drop=True)}
+
+    for grain, (finer, freq) in _SOURCES.items():
+        source = rollups[finer]
+        rollups[grain] = source.assign(
+            period=source["period"].dt.to_period(freq).dt.start_time
+        ).groupby(["period", *keys], as_index=False)[measures].sum()
+    return rollups
+
+
+def rollup_rows(rollups, grain, start=None, end=None):
+    """
+    Rows of one grain with a "label" column, optionally only the periods
+    starting in [start, end). Weeks belong to the month they start in.
+    """
+    rows = rollups.get(grain)
+    if rows is None:
+        return pd.DataFrame()
+    if start is not None:
+        periods = rows["period"].to_numpy()
+        first = periods.searchsorted(np.datetime64(pd.Timestamp(start)), "left")
+        last = periods.searchsorted(np.datetime64(pd.Timestamp(end)), "left")
+        rows = rows.iloc[first:last]
+    return rows.assign(label=period_labels(grain, rows["period"]))
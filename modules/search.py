@@ -0,0 +1,123 @@
+# modules/search.py
+# ======================================================
+# ---------------- Product Search ---------------------
+# ======================================================
+# The catalog is too large for a dropdown listing every product, so the
+# product filter's options come from a search callback. Searches run on a
+# prefix index built once per dataset version: every lowercase word of a
+# product name, and its product_id, sorted next to the product it belongs
+# to. A query word matches the index keys in one sorted range (bisect), and
+# a product matches when every query word prefixes one of its keys.
+
+import bisect
+import heapq
+import re
+import threading
+
+import pandas as pd
+
+from modules import config
+
+PRODUCT_COLUMNS = ["product_id", "product_name"]
+
+_WORD = re.compile(r"\w+")
+
+
+def tokenize(text):
+    """Lowercase words of a name or query."""
+    return _WORD.findall(str(text).lower())
+
+
+class ProductIndex:
+    """Prefix index over the words of product names and the product ids."""
+
+    def __init__(self, products):
+        products = (
+            products.dropna(subset=PRODUCT_COLUMNS)
+            .drop_duplicates("product_id")
+            .reset_index(drop=True)
+        )
+        if pd.api.types.is_float_dtype(products["product_id"]):
+            products["product_id"] = products["product_id"].astype("int64")
+        self.ids = products["product_id"].tolist()
+        self.names = products["product_name"].astype(str).tolist()
+        self._lower_names = [name.lower() for name in self.names]
+        self._rows_by_id = {product_id: row for row, product_id in enumerate(self.ids)}
+
+        entries = sorted(
+            (key, row)
+            for row, (product_id, name) in enumerate(zip(self.ids, self.names))
+            for key in {*tokenize(name), str(product_id).lower()}
+        )
+        self._keys = [key for key, _row in entries]
+        self._rows = [row for _key, row in entries]
+
+    def __len__(self):
+        return len(self.ids)
+
+    def _prefixed(self, word):
+        """Rows with a key starting with word."""
+        first = bisect.bisect_left(self._keys, word)
+        last = bisect.bisect_left(self._keys, word + "\uffff", lo=first)
+        return set(self._rows[first:last])
+
+    def search(self, query, limit=None):
+        """
+        (product_id, product_name) of up to `limit` products matching every word
+        of the query; names starting with the query first, then by name.
+        """
+        words = tokenize(query)
+        if not words:
+            return []
+        rows = None
+        for word in sorted(words, key=len, reverse=True):  # longest: fewest rows
+            rows = self._prefixed(word) if rows is None else rows & self._prefixed(word)
+            if not rows:
+                return []
+        query = query.strip().lower()
+        best = heapq.nsmallest(
+            limit or config.PRODUCT_SEARCH_LIMIT,
+            rows,
+            key=lambda row: (
+                not self._lower_names[row].startswith(query),
+                self._lower_names[row],
+            ),
+        )
+        return [(self.ids[row], self.names[row]) for row in best]
+
+    def label(self, product_id):
+        row = self._rows_by_id.get(product_id)
+        name = self.names[row] if row is not None else "Unknown product"
+        return f"{name} (#{product_id})"
+
+    def options(self, product_ids):
+        """Dropdown options for product ids."""
+        return [
+            {"label": self.label(product_id), "value": product_id}
+            for product_id in product_ids
+        ]
+
+
+class ProductSearch:
+    """The product index of a dataset, rebuilt once per dataset version."""
+
+    def __init__(self, dataset):
+        self.dataset = dataset
+        self.hits = 0
+        self.misses = 0
+        self._version = None
+        self._index = None
+        self._lock = threading.Lock()
+
+    def get(self):
+        with self._lock:
+            if self._version == self.dataset.version:
+                self.hits += 1
+                return self._index
+            self.misses += 1
+            version = self.dataset.version
+            products = self.dataset.products()
+            if not set(PRODUCT_COLUMNS).issubset(products.columns):
+                products = pd.DataFrame(columns=PRODUCT_COLUMNS)
+            self._version, self._index = version, ProductIndex(products)
+            return self._index
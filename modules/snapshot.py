@@ -0,0 +1,184 @@
+# modules/snapshot.py
+# ======================================================
+# ---------------- Warm-Start Snapshot ----------------
+# ======================================================
+# One versioned file with the fully prepared state: the dataset partitions
+# (cleaned orders, partial KPIs and KPI cube of each), the merged KPI tables
+# and the pages serialized so far (all figures included). Pages are never
+# built just for the snapshot, and the file is written by a background
+# thread, off the boot / reload request path.
+# A boot whose inputs (data files, preparation code, library versions,
+# settings such as the memory budget) are unchanged restores it instead of
+# loading, cleaning and charting again.
+#
+# The file is a pickle written by this app into its own cache directory;
+# only point SWIFTSHOP_SNAPSHOT_PATH at locations you trust.
+
+import copy
+import hashlib
+import logging
+import os
+import pickle
+import sys
+import threading
+
+import dash
+import dash_bootstrap_components as dbc
+import pandas as pd
+import plotly
+
+from modules import config
+from modules.data_load import data_sources
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_FORMAT = 2  # bump when the snapshot contents change shape
+
+# Code that shapes what is stored: editing any of these invalidates snapshots
+SOURCE_MODULES = [
+    "data_load.py",
+    "data_clean.py",
+    "validation.py",
+    "dataset.py",
+    "sqlite_store.py",
+    "kpi_calculations.py",
+    "aggregates.py",
+    "rollups.py",
+    "customers.py",
+    "anomalies.py",
+    "charts.py",
+    "downsample.py",
+    "layout.py",
+    "style.py",
+]
+# ... and outside modules/: the page factories live in app.py
+PROJECT_SOURCES = ["app.py"]
+
+
+def input_fingerprint(data_path):
+    """Hash of everything the prepared state depends on."""
+    digest = hashlib.sha1()
+    digest.update(repr((SNAPSHOT_FORMAT, os.path.abspath(data_path))).encode())
+    for store, source_path in data_sources(data_path).items():
+        stat = os.stat(source_path)
+        digest.update(repr((store, stat.st_size, stat.st_mtime_ns)).encode())
+    # Libraries whose output is pickled / serialized into the pages
+    digest.update(
+        repr(
+            (
+                sys.version_info[:2],
+                pd.__version__,
+                plotly.__version__,
+                dash.__version__,
+                dbc.__version__,
+            )
+        ).encode()
+    )
+    # Settings baked into the stored data and the serialized pages (the
+    # memory budget shrinks the orders frames in place of the originals)
+    digest.update(
+        repr(
+            (
+                config.STORAGE,
+                config.MEMORY_BUDGET_MB,
+                config.CHART_POINT_BUDGET,
+                config.WEBGL_THRESHOLD,
+                config.KPI_REFRESH_SECONDS,
+                config.ANOMALY_Z,
+                config.ANOMALY_HALFLIFE_DAYS,
+                config.ANOMALY_WARMUP,
+                config.ANOMALY_SEASON,
+                config.VALIDATION,
+                config.VALIDATION_AMOUNT_TOLERANCE,
+            )
+        ).encode()
+    )
+
+    modules_dir = os.path.dirname(os.path.abspath(__file__))
+    sources = [os.path.join(modules_dir, name) for name in SOURCE_MODULES]
+    sources += [os.path.join(config.PROJECT_ROOT, name) for name in PROJECT_SOURCES]
+    for source_path in sources:
+        with open(source_path, "rb") as source:
+            digest.update(source.read())
+    return digest.hexdigest()
+
+
+def load_snapshot(data_path, path=None):
+    """The snapshot for data_path, or None if missing, stale or unreadable."""
+    path = path or config.SNAPSHOT_PATH
+    try:
+        with open(path, "rb") as snapshot_file:
+            snapshot = pickle.load(snapshot_file)
+    except FileNotFoundError:
+        return None
+    except Exception as error:  # corrupt or written by an incompatible version
+        logger.warning("Ignoring unreadable snapshot %s: %s", path, error)
+        return None
+
+    if (
+        snapshot.get("format") != SNAPSHOT_FORMAT
+        or snapshot.get("fingerprint") != input_fingerprint(data_path)
+    ):
+        return None
+    return snapshot
+
+
+_write_lock = threading.Lock()  # one writer at a time per process
+
+
+def snapshot_state(dataset, page_caches):
+    """
+    The dataset and the pages serialized so far. Pages not built yet are left
+    out: they are still built on first request after a restore.
+    """
+    pages = {}
+    for route, cache in page_caches.items():
+        serialized = cache.serialized()
+        if serialized is not None:
+            pages[route] = serialized
+    return {
+        "format": SNAPSHOT_FORMAT,
+        "fingerprint": input_fingerprint(dataset.data_path),
+        "version": dataset.version,
+        # Shallow copies: the memory budget swaps partition frames while the
+        # writer thread may still be pickling (the frames are never mutated)
+        "partitions": [copy.copy(partition) for partition in dataset.partitions],
+        "pages": pages,
+    }
+
+
+def save_snapshot(snapshot, path=None):
+    """Write a snapshot_state() to one file."""
+    path = path or config.SNAPSHOT_PATH
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with _write_lock:
+        temp_path = f"{path}.{os.getpid()}.tmp"
+        with open(temp_path, "wb") as snapshot_file:
+            pickle.dump(snapshot, snapshot_file, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(temp_path, path)  # atomic: readers never see a partial file
+
+
+def save_snapshot_in_background(dataset, page_caches):
+    """
+    Capture the current state now and write it from a daemon thread. Returns
+    the thread (None when snapshots are off).
+    """
+    if not config.SNAPSHOT:
+        return None
+    writer = threading.Thread(
+        target=save_snapshot,
+        args=(snapshot_state(dataset, page_caches),),
+        name="swiftshop-snapshot",
+        daemon=True,
+    )
+    writer.start()
+    return writer
+
+
+def warm_start(dataset, page_caches):
+    """Restore the serialized pages of the snapshot the dataset came from."""
+    if not config.SNAPSHOT or dataset.snapshot is None:
+        return
+    for route, (body, etag) in dataset.snapshot["pages"].items():
+        if route in page_caches:
+            page_caches[route].restore(body, etag)
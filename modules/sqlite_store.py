@@ -0,0 +1,371 @@
+# modules/sqlite_store.py
+# ======================================================
+# ---------------- SQLite Storage ---------------------
+# ======================================================
+# Keeps the cleaned orders in a local SQLite file instead of worker memory
+# (SWIFTSHOP_STORAGE=sqlite). Filters and group-bys run as SQL against
+# indexed columns, so only aggregates and one table page reach pandas.
+#
+# Each store CSV is cleaned once and imported; the file remembers which
+# version of every store it holds, so later boots and reloads only import
+# stores whose CSV changed. Partial KPIs and KPI cubes per (store, year)
+# are also aggregated in SQL.
+
+import contextlib
+import os
+import sqlite3
+
+import pandas as pd
+
+from modules import config
+from modules.aggregates import CUBE_KEYS
+from modules.customers import CUSTOMER_COLUMNS
+from modules.data_load import load_data
+from modules.dataset import Dataset, Partition
+from modules.kpi_calculations import MEASURES, PARTIAL_KEYS
+from modules.metrics import SELECTION_ROWS
+from modules.profiling import stage
+from modules.search import PRODUCT_COLUMNS
+
+ORDERS_TABLE = "orders"
+INDEXED_COLUMNS = [
+    ("store", "year", "month"),
+    ("order_date",),
+    ("customer_region",),
+    ("category",),
+    ("product_name",),
+    ("product_id",),
+]
+
+
+def _quote(column):
+    return '"' + column.replace('"', '""') + '"'
+
+
+def filter_sql(
+    start_date=None,
+    end_date=None,
+    selected_regions=None,
+    selected_categories=None,
+    selected_stores=None,
+    selected_products=None,
+):
+    """
+    WHERE clause and parameters for the dashboard filters.
+
+    Same semantics as filters.filter_orders: dates are compared by month.
+    """
+    clauses, params = [], []
+
+    # --- Date Filter (the year bounds let SQLite use the partition index) ---
+    if start_date and end_date:
+        start_date = pd.to_datetime(start_date)
+        end_date = pd.to_datetime(end_date)
+        clauses.append("year BETWEEN ? AND ? AND year * 12 + month BETWEEN ? AND ?")
+        params += [
+            start_date.year,
+            end_date.year,
+            start_date.year * 12 + start_date.month,
+            end_date.year * 12 + end_date.month,
+        ]
+
+    # --- Region / Category / Store / Product Filters ---
+    for column, values in (
+        ("customer_region", selected_regions),
+        ("category", selected_categories),
+        ("store", selected_stores),
+        ("product_id", selected_products),
+    ):
+        if values:
+            clauses.append(f"{column} IN ({', '.join('?' * len(values))})")
+            params += list(values)
+
+    return (" WHERE " + " AND ".join(clauses) if clauses else ""), params
+
+
+class SQLiteDataset(Dataset):
+    """Dataset whose orders live in SQLite; queries are pushed down as SQL."""
+
+    def __init__(self, data_path=None, db_path=None):
+        self.db_path = db_path or config.SQLITE_PATH
+        self._columns = pd.Index([])
+        os.makedirs(os.path.dirname(self.db_path) or ".", exist_ok=True)
+        with self._connect() as connection:
+            connection.execute("PRAGMA journal_mode=WAL")  # readers never block
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS sources "
+                "(store TEXT PRIMARY KEY, mtime_ns INTEGER, size INTEGER)"
+            )
+        super().__init__(data_path)
+
+    @contextlib.contextmanager
+    def _connect(self):
+        """A connection for one unit of work: committed (or rolled back) and closed."""
+        connection = sqlite3.connect(self.db_path, timeout=30)
+        try:
+            with connection:
+                yield connection
+        finally:
+            connection.close()
+
+    def _query(self, sql, params=()):
+        with stage("sql"), self._connect() as connection:
+            return pd.read_sql_query(sql, connection, params=params)
+
+    def _read_orders(self, sql, params=()):
+        orders = self._query(sql, params)
+        if "order_date" in orders.columns:
+            orders["order_date"] = pd.to_datetime(orders["order_date"])
+        return orders
+
+    # ======================================================
+    # ---------------- Import -----------------------------
+    # ======================================================
+    def _stored_signatures(self):
+        with self._connect() as connection:
+            rows = connection.execute("SELECT store, mtime_ns, size FROM sources")
+            return {store: (mtime_ns, size) for store, mtime_ns, size in rows}
+
+    def _restore_snapshot(self, signatures):
+        # Only valid when the database holds exactly these store versions
+        if self._stored_signatures() != signatures:
+            return None
+        snapshot = super()._restore_snapshot(signatures)
+        if snapshot is not None:
+            self._columns = self._table_columns()
+        return snapshot
+
+    def _forget_missing_stores(self, signatures):
+        missing = set(self._stored_signatures()) - set(signatures)
+        with self._connect() as connection:
+            for store in missing:
+                connection.execute(
+                    f"DELETE FROM {ORDERS_TABLE} WHERE store = ?", (store,)
+                )
+                connection.execute("DELETE FROM sources WHERE store = ?", (store,))
+
+    def _load_store(self, store, path, signature):
+        if self._stored_signatures().get(store) != signature:
+            self._import_store(store, path, signature)
+        self._columns = self._table_columns()
+        return self._store_partitions(store)
+
+    def _import_store(self, store, path, signature):
+        df = load_data(path).assign(store=store)
+        with self._connect() as connection:
+            if self._table_columns(connection).empty:
+                df.head(0).to_sql(ORDERS_TABLE, connection, index=False)
+                for columns in INDEXED_COLUMNS:
+                    if set(columns).issubset(df.columns):
+                        connection.execute(
+                            "CREATE INDEX IF NOT EXISTS idx_{}_{} ON {} ({})".format(
+                                ORDERS_TABLE,
+                                "_".join(columns),
+                                ORDERS_TABLE,
+                                ", ".join(columns),
+                            )
+                        )
+            connection.execute(f"DELETE FROM {ORDERS_TABLE} WHERE store = ?", (store,))
+            df.to_sql(
+                ORDERS_TABLE,
+                connection,
+                index=False,
+                if_exists="append",
+                chunksize=10000,
+            )
+            connection.execute(
+                "INSERT OR REPLACE INTO sources VALUES (?, ?, ?)", (store, *signature)
+            )
+
+    def _table_columns(self, connection=None):
+        if connection is None:
+            with self._connect() as connection:
+                return self._table_columns(connection)
+        rows = connection.execute(f"PRAGMA table_info({ORDERS_TABLE})").fetchall()
+        return pd.Index([row[1] for row in rows])
+
+    # ======================================================
+    # ---------------- Aggregates in SQL ------------------
+    # ======================================================
+    def _measures_sql(self):
+        columns = set(self._columns)
+        amount = "total_amount" if "total_amount" in columns else "NULL"
+        rating = "customer_rating" if "customer_rating" in columns else "NULL"
+        return {
+            "total_amount": f"TOTAL({amount})",
+            "amount_count": f"COUNT({amount})",
+            "orders": "COUNT(*)",
+            "rating_sum": f"TOTAL({rating})",
+            "rating_count": f"COUNT({rating})",
+        }
+
+    def _grouped(self, store, keys, dropna):
+        """Measures per (year, *keys) of one store, as a frame."""
+        group = ["year"] + [key for key in keys if key != "year"]
+        measures = ", ".join(
+            f"{sql} AS {name}" for name, sql in self._measures_sql().items()
+        )
+        where = ["store = ?"] + [f"{key} IS NOT NULL" for key in keys if dropna]
+        grouped = self._query(
+            f"SELECT {', '.join(group)}, {measures} FROM {ORDERS_TABLE} "
+            f"WHERE {' AND '.join(where)} GROUP BY {', '.join(group)}",
+            (store,),
+        )
+        if "order_date" in grouped.columns:
+            grouped["order_date"] = pd.to_datetime(grouped["order_date"])
+        return grouped
+
+    def _store_partitions(self, store):
+        """Partitions of one store with partial KPIs and cubes from SQL."""
+        if not {"year", "month"}.issubset(self._columns):
+            raise ValueError("SQLite storage needs orders with an order_date column")
+
+        partial_frames = {
+            name: self._grouped(store, keys, dropna=True)
+            for name, keys in PARTIAL_KEYS.items()
+            if set(keys).issubset(self._columns)
+        }
+        cube_frame = self._grouped(
+            store, [key for key in CUBE_KEYS if key in self._columns], dropna=False
+        )
+        cube_frame["period_key"] = cube_frame["year"] * 12 + cube_frame["month"]
+
+        def year_rows(frame, year, keys):
+            in_year = frame["year"].isna() if year is None else frame["year"] == year
+            rows = frame[in_year]
+            return rows[keys + MEASURES].reset_index(drop=True)
+
+        partitions = []
+        for year in cube_frame["year"].drop_duplicates():
+            year = None if pd.isna(year) else int(year)
+            partial = {
+                name: year_rows(frame, year, PARTIAL_KEYS[name])
+                for name, frame in partial_frames.items()
+            }
+            cube = year_rows(cube_frame, year, list(cube_frame.columns.drop(MEASURES)))
+            partitions.append(Partition(store, year, None, partial=partial, cube=cube))
+        return partitions
+
+    # ======================================================
+    # ---------------- Metadata ---------------------------
+    # ======================================================
+    @property
+    def columns(self):
+        return self._columns
+
+    def date_bounds(self):
+        bounds = self._query(
+            "SELECT MIN(order_date) AS first, MAX(order_date) AS last "
+            f"FROM {ORDERS_TABLE}"
+        ).iloc[0]
+        if pd.isna(bounds["first"]):
+            return (None, None)
+        return (pd.Timestamp(bounds["first"]), pd.Timestamp(bounds["last"]))
+
+    def distinct(self, column):
+        if column not in self._columns:
+            return []
+        column = _quote(column)
+        return self._query(
+            f"SELECT {column} AS value FROM {ORDERS_TABLE} WHERE {column} IS NOT NULL "
+            f"GROUP BY {column} ORDER BY MIN(rowid)"
+        )["value"].tolist()
+
+    # ======================================================
+    # ---------------- Pushed-down Queries ----------------
+    # ======================================================
+    def select(
+        self,
+        start_date=None,
+        end_date=None,
+        selected_regions=None,
+        selected_categories=None,
+        selected_stores=None,
+        selected_products=None,
+    ):
+        where, params = filter_sql(
+            start_date,
+            end_date,
+            selected_regions,
+            selected_categories,
+            selected_stores,
+            selected_products,
+        )
+        return self._read_orders(
+            f"SELECT * FROM {ORDERS_TABLE}{where} ORDER BY store, year, rowid", params
+        )
+
+    def _pruned_cube(
+        self,
+        start_date=None,
+        end_date=None,
+        selected_stores=None,
+        selected_products=None,
+    ):
+        """
+        With products selected, the cube cells of those products' orders are
+        grouped in SQL (product_id is indexed) instead of read into pandas.
+        """
+        if not selected_products:
+            return super()._pruned_cube(start_date, end_date, selected_stores)
+        keys = [key for key in CUBE_KEYS if key in self._columns]
+        measures = ", ".join(
+            f"{sql} AS {name}" for name, sql in self._measures_sql().items()
+        )
+        where, params = filter_sql(
+            start_date,
+            end_date,
+            selected_stores=selected_stores,
+            selected_products=selected_products,
+        )
+        cube = self._query(
+            f"SELECT {', '.join(keys)}, {measures} FROM {ORDERS_TABLE}{where} "
+            f"GROUP BY {', '.join(keys)}",
+            params,
+        )
+        cube["period_key"] = cube["year"] * 12 + cube["month"]
+        return cube
+
+    def monthly_sales(self, **filters):
+        where, params = filter_sql(**filters)
+        return self._query(
+            f"SELECT year, month, TOTAL(total_amount) AS total_amount, "
+            f"COUNT(*) AS orders FROM {ORDERS_TABLE}{where} GROUP BY year, month "
+            f"HAVING year IS NOT NULL ORDER BY year, month",
+            params,
+        )
+
+    def top_products(self, limit=10, **filters):
+        where, params = filter_sql(**filters)
+        return self._query(
+            f"SELECT product_name, TOTAL(total_amount) AS total_amount "
+            f"FROM {ORDERS_TABLE}{where} GROUP BY product_name "
+            f"HAVING product_name IS NOT NULL ORDER BY total_amount DESC LIMIT ?",
+            params + [limit],
+        )
+
+    def products(self):
+        if not set(PRODUCT_COLUMNS).issubset(self._columns):
+            return pd.DataFrame(columns=PRODUCT_COLUMNS)
+        return self._query(
+            f"SELECT product_id, MIN(product_name) AS product_name FROM {ORDERS_TABLE} "
+            f"WHERE product_id IS NOT NULL GROUP BY product_id"
+        )
+
+    def customer_orders(self):
+        columns = [_quote(c) for c in CUSTOMER_COLUMNS if c in self._columns]
+        if not columns:
+            return pd.DataFrame(columns=CUSTOMER_COLUMNS)
+        return self._read_orders(f"SELECT {', '.join(columns)} FROM {ORDERS_TABLE}")
+
+    def orders_page(self, page, page_size, **filters):
+        where, params = filter_sql(**filters)
+        counted = self._query(f"SELECT COUNT(*) AS n FROM {ORDERS_TABLE}{where}", params)
+        total = int(counted["n"][0])
+        SELECTION_ROWS.observe(total)
+        rows = self._read_orders(
+            f"SELECT * FROM {ORDERS_TABLE}{where} ORDER BY store, year, rowid "
+            f"LIMIT ? OFFSET ?",
+            params + [page_size, page * page_size],
+        )
+        return rows, total
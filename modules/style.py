@@ -69,6 +69,7 @@ KPI_LABEL_STYLE = {
     "color": "#ffffff",
 }
 KPI_VALUE_STYLE = {"fontWeight": "bold", "fontSize": "18px", "color": "#ffffff"}
+KPI_CHANGE_STYLE = {"fontSize": "13px", "color": "#ffffff", "opacity": 0.85}
 KPI_ROW_STYLE = {"margin": "18px 8px 30px 8px"}  # KPI row
 
 # Page title
@@ -115,6 +116,7 @@ CHART_LAYOUT = {
 # Line and marker colors for charts
 CHART_LINE_COLOR = "#5879FF"
 CHART_MARKER_COLOR = "#D9B5C1"
+CHART_ANOMALY_COLOR = "#E4572E"
 
 
 # Table
@@ -165,6 +167,10 @@ TABLE_CONDITIONAL_STYLE = [
 ]
 
 
+# Progress bar for background filter queries (shown only while running)
+PROGRESS_HIDDEN = {"height": "6px", "marginBottom": "10px", "visibility": "hidden"}
+PROGRESS_VISIBLE = {**PROGRESS_HIDDEN, "visibility": "visible"}
+
 # Button
 BUTTON = {"marginBottom": "10px", "backgroundColor": "#C2CFF3"}
 
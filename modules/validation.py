@@ -0,0 +1,146 @@
+# modules/validation.py
+# ======================================================
+# ---------------- Data Validation --------------------
+# ======================================================
+# Quality rules checked on the raw orders of every store file before they are
+# cleaned. Each rule is a boolean mask over whole columns, and the failures
+# of a row are OR-ed into one small bit field, so all rules take a single
+# vectorized pass without per-row Python.
+#
+# Failing rows are left out of the dataset (they would skew every KPI) and
+# written with their reason codes to a quarantine CSV per store, by default
+# .cache/quarantine/<store>.csv; counts per rule go to the metrics.
+
+import logging
+import os
+
+import numpy as np
+import pandas as pd
+
+from modules import config
+from modules.metrics import QUARANTINED_ROWS, timed
+
+logger = logging.getLogger(__name__)
+
+# Reason codes, one bit each (in this order)
+RULES = [
+    "bad_date",  # order_date given but not a date
+    "amount_mismatch",  # total_amount != unit_price * quantity
+    "rating_out_of_range",  # customer_rating outside 1-5
+    "duplicate_order_id",  # order_id seen earlier in the file
+    "non_positive_quantity",
+    "negative_price",
+]
+
+
+def _numbers(df, column):
+    """A column as float64 (values that are not numbers become NaN)."""
+    values = df[column]
+    if not pd.api.types.is_numeric_dtype(values):
+        values = pd.to_numeric(values, errors="coerce")
+    return values.to_numpy(dtype=np.float64, na_value=np.nan)
+
+
+def rule_masks(df, dates=None):
+    """
+    Rule -> boolean array of the rows failing it. Rules whose columns are
+    missing are skipped; missing values only fail the rules that say so.
+    """
+    columns = set(df.columns)
+    masks = {}
+    if dates is not None:
+        masks["bad_date"] = (dates.isna() & df["order_date"].notna()).to_numpy()
+    if {"total_amount", "unit_price", "quantity"} <= columns:
+        total = _numbers(df, "total_amount")
+        expected = _numbers(df, "unit_price") * _numbers(df, "quantity")
+        with np.errstate(invalid="ignore"):
+            masks["amount_mismatch"] = np.abs(total - expected) > (
+                config.VALIDATION_AMOUNT_TOLERANCE + 1e-9 * np.abs(expected)
+            )
+    if "customer_rating" in columns:
+        rating = _numbers(df, "customer_rating")
+        with np.errstate(invalid="ignore"):
+            masks["rating_out_of_range"] = (rating < 1) | (rating > 5)
+    if "order_id" in columns:
+        order_ids = df["order_id"]
+        masks["duplicate_order_id"] = (
+            order_ids.duplicated(keep="first") & order_ids.notna()
+        ).to_numpy()
+    if "quantity" in columns:
+        with np.errstate(invalid="ignore"):
+            masks["non_positive_quantity"] = _numbers(df, "quantity") <= 0
+    if "unit_price" in columns:
+        with np.errstate(invalid="ignore"):
+            masks["negative_price"] = _numbers(df, "unit_price") < 0
+    return masks
+
+
+def reason_codes(masks, rows):
+    """One bit field per row: bit i set when the row fails RULES[i]."""
+    codes = np.zeros(rows, dtype=np.uint8)
+    for bit, rule in enumerate(RULES):
+        if rule in masks:
+            codes |= masks[rule].astype(np.uint8) << bit
+    return codes
+
+
+def reason_labels(codes):
+    """"rule;rule" labels for bit fields (each distinct code formatted once)."""
+    labels = {
+        code: ";".join(rule for bit, rule in enumerate(RULES) if code >> bit & 1)
+        for code in np.unique(codes).tolist()
+    }
+    return pd.Series(codes).map(labels).to_numpy()
+
+
+def quarantine_path(store):
+    return os.path.join(config.QUARANTINE_DIR, f"{store}.csv")
+
+
+@timed("validate")
+def validate(df, store):
+    """
+    The rows of one store's raw orders passing every rule. The other rows are
+    written to the store's quarantine file (removed when every row passes)
+    and counted per rule.
+    """
+    dates = None
+    if "order_date" in df.columns:
+        # Left unparsed in df: clean() fills values row-wise before converting
+        # dates, which is much slower with Timestamps in the rows
+        dates = pd.to_datetime(df["order_date"], errors="coerce")
+    masks = rule_masks(df, dates)
+    codes = reason_codes(masks, len(df))
+    bad = codes != 0
+
+    path = quarantine_path(store)
+    if not bad.any():
+        if os.path.exists(path):
+            os.remove(path)
+        return df
+
+    quarantined = df[bad].assign(
+        reasons=reason_labels(codes[bad]),
+        source_row=np.flatnonzero(bad) + 2,  # line in the CSV (after the header)
+    )
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    quarantined.to_csv(path, index=False)
+
+    counts = {rule: int(mask.sum()) for rule, mask in masks.items() if mask.any()}
+    for rule, count in counts.items():
+        QUARANTINED_ROWS.inc(count, store=store, rule=rule)
+    summary = ", ".join(f"{rule}: {count}" for rule, count in counts.items())
+    logger.warning(
+        "Quarantined %d of %d orders of %s (%s) -> %s",
+        int(bad.sum()),
+        len(df),
+        store,
+        summary,
+        path,
+    )
+
+    # take() rather than df[~bad]: the only copy made here, and not flagged
+    # as a slice, so clean() can keep assigning columns without copy checks
+    valid = df.take(np.flatnonzero(~bad))
+    valid.index = pd.RangeIndex(len(valid))
+    return valid
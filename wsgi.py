@@ -0,0 +1,56 @@
+# wsgi.py
+# ======================================================
+# ------------- Production Entry Point ----------------
+# ======================================================
+# The app is built once, here in the parent process: data loaded, KPIs and
+# partitions prepared, the shell and every page serialized. Gunicorn then
+# forks the workers, which share that memory copy-on-write instead of each
+# loading the data again.
+#
+#   python wsgi.py                      # workers/threads/bind from modules/config.py
+#   gunicorn --preload wsgi:server      # same app with your own gunicorn settings
+#
+# Requires: pip install gunicorn (Linux / macOS)
+
+import gc
+
+from app import create_app
+from modules import config
+
+app = create_app(preload=True)
+server = app.server  # WSGI callable
+
+
+def post_fork(_arbiter, _worker):
+    gc.enable()
+
+
+def main():
+    try:
+        from gunicorn.app.base import BaseApplication
+    except ImportError as missing:
+        raise ImportError(
+            "The production launcher requires gunicorn:\n\n    pip install gunicorn\n"
+        ) from missing
+
+    class Launcher(BaseApplication):
+        def load_config(self):
+            self.cfg.set("bind", config.BIND)
+            self.cfg.set("workers", config.WORKERS)
+            self.cfg.set("threads", config.THREADS)
+            self.cfg.set("timeout", config.WORKER_TIMEOUT)
+            self.cfg.set("preload_app", True)
+            self.cfg.set("post_fork", post_fork)
+
+        def load(self):
+            return server
+
+    # Move everything built so far out of the garbage collector's reach, so
+    # collections in the workers don't write to (and copy) the shared pages
+    gc.disable()
+    gc.freeze()
+    Launcher().run()
+
+
+if __name__ == "__main__":
+    main()